@@ -1,10 +1,10 @@
 
 import argparse
 import copy
+import random
 import sys
 import time
 
-cache = {} # you can use this to implement state caching
 directions = {'r': [(-1, -1), (-1, 1)],
                   'b': [(1, 1), (1, -1)],
                   'R': [(1, -1), (1, 1), (-1, -1), (-1, 1)],
@@ -13,8 +13,12 @@ directions = {'r': [(-1, -1), (-1, 1)],
 class State:
     # This class is used to represent a state.
     # board : a list of lists that represents the 8*8 board
-    def __init__(self, board):
+    # move  : the move that led to this state, as a tuple (from square, to square,
+    #         captured squares, piece after the move) with square i * 8 + j,
+    #         None for a state read from a file
+    def __init__(self, board, move=None):
         self.board = board
+        self.move = move
         self.width = 8
         self.height = 8
 
@@ -25,6 +29,196 @@ class State:
             print("")
         print("")
 
+WIN_VALUE = 1000000000000
+LOSS_VALUE = -1000000000000
+
+# Bound types of the transposition table entries.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# One random 64 bit key per piece per square, and one for black to move.
+zobrist_random = random.Random(1859)
+zobrist_keys = dict((piece, [[zobrist_random.getrandbits(64) for j in range(8)] for i in range(8)])
+                    for piece in ['r', 'R', 'b', 'B'])
+zobrist_black = zobrist_random.getrandbits(64)
+
+def zobrist_hash(board, player):
+    """Returns the Zobrist hash of the board with player to move."""
+    key = zobrist_black if player == 'b' else 0
+    for i, row in enumerate(board):
+        for j, piece in enumerate(row):
+            if piece != '.':
+                key ^= zobrist_keys[piece][i][j]
+    return key
+
+class TranspositionTable:
+    # This class is used to remember the positions minimax has searched.
+    # slots : size entries (key, depth, value, bound, best move, generation)
+    #         indexed by the Zobrist key. A slot keeps the deeper search, unless
+    #         its entry was stored while searching an earlier move of the game.
+    def __init__(self, size):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        """Marks the entries stored so far as older than the ones to come."""
+        self.generation += 1
+
+    def lookup(self, key):
+        """Returns the entry of the key, or None."""
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        """Stores the result of a search depth plies deep, if the replacement policy allows it."""
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[index] = (key, depth, value, bound, move, self.generation)
+
+cache = TranspositionTable(1 << 18)
+
+class SearchTimeout(Exception):
+    """Raised by SearchClock.tick once the time of a move is used up."""
+
+class SearchClock:
+    # This class is used to stop the searches of iterative deepening in time.
+    # deadline : the perf_counter() time at which the search stops
+    # nodes    : the number of nodes searched so far
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.nodes = 0
+
+    def tick(self):
+        """Called for every node searched."""
+        self.nodes += 1
+        # The clock is only read every 256 nodes.
+        if self.nodes & 255 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+clock = None
+
+# The material a capture gains, kings counting twice.
+piece_values = {'r': 1, 'R': 2, 'b': 1, 'B': 2}
+
+class MoveOrdering:
+    # This class is used to choose the order in which minimax searches the moves.
+    # killers : maps a ply to the last two quiet moves that cut the search off at that ply
+    # history : maps (from square, to square) to the sum of remaining depth squared
+    #           of the cutoffs of the quiet moves between them
+    # cutoffs, first_cutoffs : the number of cutoffs, and of those made by the first move searched
+    # heuristics : False to only search the principal variation and transposition
+    #              table moves first, True to also order the other moves by
+    #              captures, promotions, killers and history
+    def __init__(self, heuristics=False):
+        self.heuristics = heuristics
+        self.killers = {}
+        self.history = {}
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+
+    def new_search(self):
+        """Forgets the killers and halves the history scores, which belong to an earlier move."""
+        self.killers = {}
+        self.history = dict((move, score // 2) for move, score in self.history.items() if score > 1)
+
+    def order(self, count, first, moves=None, gains=None, promotions=None, ply=0):
+        """
+        Returns the indices of count moves in the order to search them: the
+        indices of first (the principal variation and transposition table moves),
+        then the other moves in generation order or, with heuristics, the captures
+        by material gained, promotions, killer moves of the ply and the other moves
+        by history score, in generation order on ties.
+
+        moves : (from square, to square, captured squares) of every move
+        gains : the material captured by every move
+        promotions : True for every move that crowns a king
+        """
+        order = []
+        for i in first:
+            if i is not None and i < count and i not in order:
+                order.append(i)
+        rest = [i for i in range(count) if i not in order]
+
+        if self.heuristics:
+            killers = self.killers.get(ply, ())
+            history = self.history
+            rest.sort(key=lambda i: (-gains[i], not promotions[i], moves[i] not in killers,
+                                     -history.get(moves[i][:2], 0)))
+        return order + rest
+
+    def cutoff(self, move, ply, remaining, first):
+        """
+        Records that the move, the first one searched if first is True, cut off
+        the search with remaining plies left.
+        """
+        self.cutoffs += 1
+        if first:
+            self.first_cutoffs += 1
+
+        if self.heuristics and not move[2]:
+            killers = self.killers.get(ply, [])
+            if move not in killers:
+                self.killers[ply] = [move] + killers[:1]
+            self.history[move[:2]] = self.history.get(move[:2], 0) + remaining * remaining
+
+    def report(self):
+        """Returns a line with the cutoff statistics."""
+        rate = 100.0 * self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+        return 'move ordering: {} cutoffs, {:.1f}% on the first move'.format(self.cutoffs, rate)
+
+ordering = MoveOrdering()
+
+# The ordering of --ordering.
+ordering_modes = ['none', 'tt', 'full']
+
+def value_to_cache(value, depth):
+    """Wins and losses count plies from the root; the table counts them from the position."""
+    if value >= WIN_VALUE // 2:
+        return value + depth
+    elif value <= LOSS_VALUE // 2:
+        return value - depth
+    return value
+
+def value_from_cache(value, depth):
+    if value >= WIN_VALUE // 2:
+        return value - depth
+    elif value <= LOSS_VALUE // 2:
+        return value + depth
+    return value
+
+def cache_probe(key, depth, alpha, beta, max_depth):
+    """
+    Returns the value of the position from the table if it settles the search,
+    None otherwise, and the best move the table has for it, None if it has none.
+    """
+    entry = cache.lookup(key)
+    if entry is None:
+        return None, None
+    if entry[1] >= max_depth - depth:
+        value = value_from_cache(entry[2], depth)
+        if entry[3] == EXACT:
+            return value, entry[4]
+        elif entry[3] == LOWER and value >= beta:
+            return value, entry[4]
+        elif entry[3] == UPPER and value <= alpha:
+            return value, entry[4]
+    return None, entry[4]
+
+def cache_save(key, depth, alpha, beta, value, move, max_depth):
+    """Stores the value the search found for the position with the window (alpha, beta)."""
+    if value <= alpha:
+        bound = UPPER
+    elif value >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    cache.store(key, max_depth - depth, value_to_cache(value, depth), bound, move)
+
 def get_opp_char(player):
     if player in ['b', 'B']:
         return ['r', 'R']
@@ -71,12 +265,15 @@ def generate_successors(state, player):
                 elif piece == 'b' and nx == 7:
                     new_board[nx][ny] = 'B'
                 
-                simple_moves.append(State(new_board))
+                simple_moves.append(State(new_board, (x * 8 + y, nx * 8 + ny, (), new_board[nx][ny])))
 
         return simple_moves
 
-    def get_jump_moves(x, y, piece, board, jumps=[]):
-        """Recursively generate all possible jump moves from a given piece."""
+    def get_jump_moves(x, y, piece, board, start, captured=()):
+        """
+        Recursively generate all possible jump moves from a given piece, which
+        started its jumps on the start square and captured the captured squares.
+        """
         jump_moves = []
 
         for dx, dy in directions[piece]:
@@ -96,13 +293,14 @@ def generate_successors(state, player):
                 elif piece == 'b' and jx == 7:
                     new_board[jx][jy] = 'B'
                 
-                next_jumps = get_jump_moves(jx, jy, piece, new_board, jumps + [(jx, jy)])
+                next_captured = captured + (nx * 8 + ny,)
+                next_jumps = get_jump_moves(jx, jy, piece, new_board, start, next_captured)
 
                 if next_jumps:
                     jump_moves.extend(next_jumps)
 
                 else:
-                    jump_moves.append(State(new_board))
+                    jump_moves.append(State(new_board, (start, jx * 8 + jy, next_captured, new_board[jx][jy])))
 
         return jump_moves
 
@@ -111,7 +309,7 @@ def generate_successors(state, player):
         for j in range(state.width):
             piece = state.board[i][j]
             if piece.lower() == player:
-                jump_moves.extend(get_jump_moves(i, j, piece, state.board))
+                jump_moves.extend(get_jump_moves(i, j, piece, state.board, i * 8 + j))
 
     if jump_moves:
         return jump_moves
@@ -124,15 +322,31 @@ def generate_successors(state, player):
 
     return successors
 
-def check_winner(state):
+def has_move(board, player):
     """
-    Determines if the game has reached a terminal state.
-    
-    Returns:
-    'r' : if red wins
-    'b' : if black wins
-    '': if not terminal
+    Returns True if player has a legal move, stopping at the first one found
+    instead of generating every successor.
     """
+    opp_pieces = get_opp_char(player)
+
+    for i in range(8):
+        for j in range(8):
+            piece = board[i][j]
+            if piece.lower() == player:
+                for dx, dy in directions[piece]:
+                    nx, ny = i + dx, j + dy
+                    if not is_within_bounds(nx, ny):
+                        continue
+                    if board[nx][ny] == '.':
+                        return True
+                    jx, jy = i + 2*dx, j + 2*dy
+                    if is_within_bounds(jx, jy) and board[nx][ny] in opp_pieces and board[jx][jy] == '.':
+                        return True
+
+    return False
+
+def count_winner(state):
+    """Returns the winner if a side has no pieces left, '' otherwise."""
     red_pieces = 0
     black_pieces = 0
     
@@ -147,17 +361,54 @@ def check_winner(state):
         return 'b'
     elif black_pieces == 0:
         return 'r'
+    return ''
+
+def check_winner(state):
+    """
+    Determines if the game has reached a terminal state.
     
-    red_moves = any(generate_successors(state, 'r'))
-    black_moves = any(generate_successors(state, 'b'))
-    
-    if not red_moves:
+    Returns:
+    'r' : if red wins
+    'b' : if black wins
+    '': if not terminal
+    """
+    winner = count_winner(state)
+    if winner:
+        return winner
+
+    if not has_move(state.board, 'r'):
         return 'b'
-    elif not black_moves:
+    elif not has_move(state.board, 'b'):
         return 'r'
     
     return ''
 
+def check_winner_and_successors(state, player):
+    """
+    check_winner of a state with player to move, together with the successors
+    of player so that the search expands the state without generating them again.
+    The successors are only generated if the state is not won by a lack of pieces
+    or of red moves, they are [] when there is a winner.
+    """
+    winner = count_winner(state)
+    if winner:
+        return winner, []
+
+    if player == 'r':
+        successors = generate_successors(state, 'r')
+        if not successors:
+            return 'b', []
+        elif not has_move(state.board, 'b'):
+            return 'r', []
+    else:
+        if not has_move(state.board, 'r'):
+            return 'b', []
+        successors = generate_successors(state, 'b')
+        if not successors:
+            return 'r', []
+
+    return '', successors
+
 
 def evaluate(state, depth, max_depth):
     """Evaluates Non-Terminal States"""
@@ -184,9 +435,6 @@ def evaluate(state, depth, max_depth):
 
 def utility(winner, depth):
     """Computes the utility value for a terminal state in the game."""
-    
-    WIN_VALUE = 1000000000000
-    LOSS_VALUE = -1000000000000
 
     if winner == 'r':
         return WIN_VALUE - depth
@@ -194,62 +442,564 @@ def utility(winner, depth):
         return LOSS_VALUE + depth
 
 
-def minimax(state, depth, alpha, beta, maximizing_player, max_depth):
+def pv_order(count, pv):
+    """Returns the indices of count successors, the first move of the principal variation pv first."""
+    if pv and pv[0] < count:
+        return [pv[0]] + [i for i in range(count) if i != pv[0]]
+    return range(count)
+
+def order_successors(state, successors, depth, pv, tt_move):
+    """Returns the indices of the successors in the order minimax searches them."""
+    if ordering is None:
+        return pv_order(len(successors), pv)
+    first = (pv[0] if pv else None, tt_move)
+    if not ordering.heuristics:
+        return ordering.order(len(successors), first)
+
+    board = state.board
+    moves = [child.move[:3] for child in successors]
+    gains = [sum([piece_values[board[square // 8][square % 8]] for square in captured])
+             for start, end, captured in moves]
+    promotions = [child.move[3] != board[child.move[0] // 8][child.move[0] % 8] for child in successors]
+    return ordering.order(len(successors), first, moves, gains, promotions, depth)
+
+def minimax(state, depth, alpha, beta, maximizing_player, max_depth, pv=()):
     """
     Minimax algorithm with alpha-beta pruning. Explores the game tree depth-first.
+    Positions searched before, in this search or an earlier one, are answered
+    from the transposition table when it has searched them deep enough.
+    pv is the principal variation of a shallower search through this state, as
+    successor indices, whose moves are searched first.
     """
-    winner = check_winner(state)
+    if clock is not None:
+        clock.tick()
+
+    key = None
+    tt_move = None
+    if cache is not None and depth < max_depth:
+        key = zobrist_hash(state.board, 'r' if maximizing_player else 'b')
+        value, tt_move = cache_probe(key, depth, alpha, beta, max_depth)
+        if value is not None:
+            return value
+
+    if depth == max_depth:
+        winner = check_winner(state)
+        if winner:
+            return utility(winner, depth)
+        return evaluate(state, depth, max_depth)
 
+    winner, successors = check_winner_and_successors(state, 'r' if maximizing_player else 'b')
     if winner:
         return utility(winner, depth)
-    elif depth == max_depth:
-        return evaluate(state, depth, max_depth)
+
+    alpha_orig, beta_orig = alpha, beta
+    best_move = None
 
     if maximizing_player:
         max_eval = float('-inf')
-        for child in generate_successors(state, 'r'):
-            eval = minimax(child, depth + 1, alpha, beta, False, max_depth)
-            max_eval = max(max_eval, eval)
+        for n, i in enumerate(order_successors(state, successors, depth, pv, tt_move)):
+            child_pv = pv[1:] if pv and i == pv[0] else ()
+            eval = minimax(successors[i], depth + 1, alpha, beta, False, max_depth, child_pv)
+            if eval > max_eval:
+                max_eval, best_move = eval, i
             alpha = max(alpha, eval)
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(successors[i].move[:3], depth, max_depth - depth, n == 0)
                 break
-        return max_eval
+        best_eval = max_eval
     else:
         min_eval = float('inf')
-        for child in generate_successors(state, 'b'):
-            eval = minimax(child, depth + 1, alpha, beta, True, max_depth)
-            min_eval = min(min_eval, eval)
+        for n, i in enumerate(order_successors(state, successors, depth, pv, tt_move)):
+            child_pv = pv[1:] if pv and i == pv[0] else ()
+            eval = minimax(successors[i], depth + 1, alpha, beta, True, max_depth, child_pv)
+            if eval < min_eval:
+                min_eval, best_move = eval, i
             beta = min(beta, eval)
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(successors[i].move[:3], depth, max_depth - depth, n == 0)
                 break
-        return min_eval
+        best_eval = min_eval
 
-def find_best_move(state, turn, max_depth):
+    if key is not None:
+        cache_save(key, depth, alpha_orig, beta_orig, best_eval, best_move, max_depth)
+
+    return best_eval
+
+def search_root(state, turn, max_depth, pv=()):
     """
-    Finds the best move for current player using the minimax algorithm with alpha-beta pruning.
+    The alpha-beta search of find_best_move. Returns the successors of the state,
+    the index of the best one (None if there are none) and its value.
     """
+    successors = generate_successors(state, turn)
     best_move = None
     best_value = float('-inf')
     alpha = float('-inf')
     beta = float('inf')
 
-    for move in generate_successors(state, turn):
-        move_value = minimax(move, 1, alpha, beta, False, max_depth)
+    for i in order_successors(state, successors, 0, pv, None):
+        child_pv = pv[1:] if pv and i == pv[0] else ()
+        move_value = minimax(successors[i], 1, alpha, beta, False, max_depth, child_pv)
         
         if move_value > best_value:
             best_value = move_value
-            best_move = move
+            best_move = i
         
         alpha = max(alpha, best_value)
     
-    return best_move
+    return successors, best_move, best_value
+
+def find_best_move(state, turn, max_depth):
+    """
+    Finds the best move for current player using the minimax algorithm with alpha-beta pruning.
+    """
+    if cache is not None:
+        cache.new_search()
+    if ordering is not None:
+        ordering.new_search()
+
+    successors, best_move, best_value = search_root(state, turn, max_depth)
+    if best_move is None:
+        return None
+    return successors[best_move]
+
+def cache_line(state, player, length):
+    """
+    Returns the successor indices of the best moves the transposition table has
+    from the state on, player to move first, at most length of them.
+    """
+    line = []
+    while cache is not None and len(line) < length:
+        entry = cache.lookup(zobrist_hash(state.board, player))
+        if entry is None or entry[4] is None:
+            break
+        successors = generate_successors(state, player)
+        if entry[4] >= len(successors):
+            break
+        line.append(entry[4])
+        state = successors[entry[4]]
+        player = get_next_turn(player)
+    return line
+
+EMPTY = ord('.')
+piece_codes = dict((piece, ord(piece)) for piece in ['r', 'R', 'b', 'B'])
+code_directions = dict((piece_codes[piece], moves) for piece, moves in directions.items())
+code_opponents = {ord('r'): (ord('b'), ord('B')), ord('R'): (ord('b'), ord('B')),
+                  ord('b'): (ord('r'), ord('R')), ord('B'): (ord('r'), ord('R'))}
+code_values = {ord('r'): 1, ord('R'): 2, ord('b'): -1, ord('B'): -2}
+zobrist_squares = dict((piece_codes[piece], [key for row in keys for key in row]) for piece, keys in zobrist_keys.items())
+
+class Position:
+    # This class is the compact board of the search: moves are made and unmade
+    # in place instead of copying the board for every child.
+    # squares  : a bytearray of the 64 characters of the board, square i * 8 + j
+    # key      : the Zobrist hash of the board with red to move
+    # material : the value of evaluate, red pieces minus black ones, kings counting twice
+    # red, black : the number of pieces of each side
+    # A move is a tuple (from square, to square, captured squares, piece after the move),
+    # and moves() returns them in the order generate_successors returns the children.
+    def __init__(self, board):
+        self.squares = bytearray(''.join([''.join(row) for row in board]), 'ascii')
+        self.key = zobrist_hash(board, 'r')
+        self.material = 0
+        self.red = 0
+        self.black = 0
+        for code in self.squares:
+            if code != EMPTY:
+                self.material += code_values[code]
+                if code_values[code] > 0:
+                    self.red += 1
+                else:
+                    self.black += 1
+
+    def to_board(self):
+        """Returns the board as a list of lists, for State."""
+        text = self.squares.decode('ascii')
+        return [list(text[i * 8:(i + 1) * 8]) for i in range(8)]
+
+    def moves(self, player):
+        """Returns the jumps of player if it has any, and its simple moves otherwise."""
+        squares = self.squares
+        mine = (piece_codes[player], piece_codes[player.upper()])
+        moves = []
+
+        for square in range(64):
+            if squares[square] in mine:
+                self.add_jumps(moves, square, square // 8, square % 8, squares[square], [])
+        if moves:
+            return moves
+
+        for square in range(64):
+            piece = squares[square]
+            if piece in mine:
+                x, y = square // 8, square % 8
+                for dx, dy in code_directions[piece]:
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < 8 and 0 <= ny < 8 and squares[nx * 8 + ny] == EMPTY:
+                        moves.append((square, nx * 8 + ny, (), promote(piece, nx)))
+        return moves
+
+    def add_jumps(self, moves, start, x, y, piece, captured):
+        """
+        Adds the jump sequences of the piece from (x, y) to moves, hopping on the
+        board in place and undoing every hop. Returns True if it found any.
+        """
+        squares = self.squares
+        opponents = code_opponents[piece]
+        found = False
 
-def start_game(state, turn, max_depth):
+        for dx, dy in code_directions[piece]:
+            nx, ny = x + dx, y + dy
+            jx, jy = x + 2 * dx, y + 2 * dy
+            if 0 <= jx < 8 and 0 <= jy < 8 and squares[nx * 8 + ny] in opponents and squares[jx * 8 + jy] == EMPTY:
+                found = True
+                taken = squares[nx * 8 + ny]
+                squares[x * 8 + y] = EMPTY
+                squares[nx * 8 + ny] = EMPTY
+                squares[jx * 8 + jy] = piece
+                captured.append(nx * 8 + ny)
+
+                if not self.add_jumps(moves, start, jx, jy, piece, captured):
+                    moves.append((start, jx * 8 + jy, tuple(captured), promote(piece, jx)))
+
+                captured.pop()
+                squares[jx * 8 + jy] = EMPTY
+                squares[nx * 8 + ny] = taken
+                squares[x * 8 + y] = piece
+
+        return found
+
+    def make(self, move):
+        """Plays the move and returns the captured pieces, for unmake."""
+        start, end, captured, piece = move
+        squares = self.squares
+        moved = squares[start]
+        taken = bytes([squares[square] for square in captured])
+
+        squares[start] = EMPTY
+        squares[end] = piece
+        self.key ^= zobrist_squares[moved][start] ^ zobrist_squares[piece][end]
+        self.material += code_values[piece] - code_values[moved]
+
+        for square, code in zip(captured, taken):
+            squares[square] = EMPTY
+            self.key ^= zobrist_squares[code][square]
+            self.material -= code_values[code]
+        if code_values[moved] > 0:
+            self.black -= len(captured)
+        else:
+            self.red -= len(captured)
+
+        return moved, taken
+
+    def unmake(self, move, undo):
+        """Takes back the move, given what make returned."""
+        start, end, captured, piece = move
+        moved, taken = undo
+        squares = self.squares
+
+        for square, code in zip(captured, taken):
+            squares[square] = code
+            self.key ^= zobrist_squares[code][square]
+            self.material += code_values[code]
+        if code_values[moved] > 0:
+            self.black += len(captured)
+        else:
+            self.red += len(captured)
+
+        squares[end] = EMPTY
+        squares[start] = moved
+        self.key ^= zobrist_squares[moved][start] ^ zobrist_squares[piece][end]
+        self.material -= code_values[piece] - code_values[moved]
+
+    def has_move(self, player):
+        """The has_move of the position."""
+        squares = self.squares
+        mine = (piece_codes[player], piece_codes[player.upper()])
+
+        for square in range(64):
+            piece = squares[square]
+            if piece in mine:
+                x, y = square // 8, square % 8
+                for dx, dy in code_directions[piece]:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < 8 and 0 <= ny < 8):
+                        continue
+                    if squares[nx * 8 + ny] == EMPTY:
+                        return True
+                    jx, jy = x + 2 * dx, y + 2 * dy
+                    if 0 <= jx < 8 and 0 <= jy < 8 and squares[nx * 8 + ny] in code_opponents[piece] \
+                            and squares[jx * 8 + jy] == EMPTY:
+                        return True
+
+        return False
+
+    def winner(self):
+        """The check_winner of the position."""
+        if self.red == 0:
+            return 'b'
+        elif self.black == 0:
+            return 'r'
+
+        if not self.has_move('r'):
+            return 'b'
+        elif not self.has_move('b'):
+            return 'r'
+
+        return ''
+
+    def winner_and_moves(self, player):
+        """The check_winner_and_successors of the position, with moves instead of successors."""
+        if self.red == 0:
+            return 'b', []
+        elif self.black == 0:
+            return 'r', []
+
+        if player == 'r':
+            moves = self.moves('r')
+            if not moves:
+                return 'b', []
+            elif not self.has_move('b'):
+                return 'r', []
+        else:
+            if not self.has_move('r'):
+                return 'b', []
+            moves = self.moves('b')
+            if not moves:
+                return 'r', []
+
+        return '', moves
+
+def promote(piece, row):
+    """Returns the piece after landing on the given row."""
+    if piece == piece_codes['r'] and row == 0:
+        return piece_codes['R']
+    elif piece == piece_codes['b'] and row == 7:
+        return piece_codes['B']
+    return piece
+
+def order_position_moves(position, moves, depth, pv, tt_move):
+    """The order_successors of the compact engine."""
+    if ordering is None:
+        return pv_order(len(moves), pv)
+    first = (pv[0] if pv else None, tt_move)
+    if not ordering.heuristics:
+        return ordering.order(len(moves), first)
+
+    squares = position.squares
+    gains = [sum([abs(code_values[squares[square]]) for square in move[2]]) for move in moves]
+    promotions = [move[3] != squares[move[0]] for move in moves]
+    return ordering.order(len(moves), first, [move[:3] for move in moves], gains, promotions, depth)
+
+def position_minimax(position, depth, alpha, beta, maximizing_player, max_depth, pv=()):
+    """
+    The minimax of the compact engine: it makes and unmakes the moves on the
+    position instead of generating child states.
+    """
+    if clock is not None:
+        clock.tick()
+
+    key = None
+    tt_move = None
+    if cache is not None and depth < max_depth:
+        key = position.key ^ zobrist_black if not maximizing_player else position.key
+        value, tt_move = cache_probe(key, depth, alpha, beta, max_depth)
+        if value is not None:
+            return value
+
+    if depth == max_depth:
+        winner = position.winner()
+        if winner:
+            return utility(winner, depth)
+        return position.material
+
+    winner, moves = position.winner_and_moves('r' if maximizing_player else 'b')
+    if winner:
+        return utility(winner, depth)
+
+    alpha_orig, beta_orig = alpha, beta
+    best_move = None
+
+    if maximizing_player:
+        best_eval = float('-inf')
+        for n, i in enumerate(order_position_moves(position, moves, depth, pv, tt_move)):
+            child_pv = pv[1:] if pv and i == pv[0] else ()
+            undo = position.make(moves[i])
+            eval = position_minimax(position, depth + 1, alpha, beta, False, max_depth, child_pv)
+            position.unmake(moves[i], undo)
+            if eval > best_eval:
+                best_eval, best_move = eval, i
+            alpha = max(alpha, eval)
+            if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(moves[i][:3], depth, max_depth - depth, n == 0)
+                break
+    else:
+        best_eval = float('inf')
+        for n, i in enumerate(order_position_moves(position, moves, depth, pv, tt_move)):
+            child_pv = pv[1:] if pv and i == pv[0] else ()
+            undo = position.make(moves[i])
+            eval = position_minimax(position, depth + 1, alpha, beta, True, max_depth, child_pv)
+            position.unmake(moves[i], undo)
+            if eval < best_eval:
+                best_eval, best_move = eval, i
+            beta = min(beta, eval)
+            if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(moves[i][:3], depth, max_depth - depth, n == 0)
+                break
+
+    if key is not None:
+        cache_save(key, depth, alpha_orig, beta_orig, best_eval, best_move, max_depth)
+
+    return best_eval
+
+def search_position_root(position, turn, max_depth, pv=()):
+    """The search_root of the compact engine, returning moves instead of successors."""
+    moves = position.moves(turn)
+    best_move = None
+    best_value = float('-inf')
+    alpha = float('-inf')
+    beta = float('inf')
+
+    for i in order_position_moves(position, moves, 0, pv, None):
+        child_pv = pv[1:] if pv and i == pv[0] else ()
+        undo = position.make(moves[i])
+        move_value = position_minimax(position, 1, alpha, beta, False, max_depth, child_pv)
+        position.unmake(moves[i], undo)
+
+        if move_value > best_value:
+            best_value = move_value
+            best_move = i
+
+        alpha = max(alpha, best_value)
+
+    return moves, best_move, best_value
+
+def position_state(position, move):
+    """Returns the State after the move, leaving the position as it was."""
+    undo = position.make(move)
+    state = State(position.to_board())
+    position.unmake(move, undo)
+    return state
+
+def find_best_position_move(state, turn, max_depth):
+    """
+    The find_best_move of the compact engine. Only the chosen move gets a State.
+    """
+    if cache is not None:
+        cache.new_search()
+    if ordering is not None:
+        ordering.new_search()
+
+    position = Position(state.board)
+    moves, best_move, best_value = search_position_root(position, turn, max_depth)
+    if best_move is None:
+        return None
+    return position_state(position, moves[best_move])
+
+def position_cache_line(position, player, length):
+    """The cache_line of the compact engine."""
+    line = []
+    made = []
+    while cache is not None and len(line) < length:
+        entry = cache.lookup(position.key ^ zobrist_black if player == 'b' else position.key)
+        if entry is None or entry[4] is None:
+            break
+        moves = position.moves(player)
+        if entry[4] >= len(moves):
+            break
+        line.append(entry[4])
+        made.append((moves[entry[4]], position.make(moves[entry[4]])))
+        player = get_next_turn(player)
+
+    for move, undo in reversed(made):
+        position.unmake(move, undo)
+    return line
+
+# The moves a game is expected to last, to share --gametime between them.
+gametime_moves = 20
+
+def iterative_deepening(state, turn, seconds, max_depth, engine='list'):
+    """
+    Searches 1, 2, 3... plies deep until max_depth, a forced win or loss is
+    found, or the seconds are used up, and returns the best move of the deepest
+    search that completed. Every search first tries the principal variation of
+    the previous one: the best move at the root, then the best moves the
+    transposition table has below it.
+    """
+    global clock
+
+    if cache is not None:
+        cache.new_search()
+    if ordering is not None:
+        ordering.new_search()
+
+    start = time.perf_counter()
+    position = Position(state.board) if engine == 'compact' else None
+    best_state = None
+    pv = ()
+
+    try:
+        for depth in range(1, max_depth + 1):
+            if engine == 'compact':
+                moves, best_move, best_value = search_position_root(position, turn, depth, pv)
+                if best_move is None:
+                    return None
+                best_state = position_state(position, moves[best_move])
+                undo = position.make(moves[best_move])
+                pv = [best_move] + position_cache_line(position, 'b', depth - 1)
+                position.unmake(moves[best_move], undo)
+            else:
+                successors, best_move, best_value = search_root(state, turn, depth, pv)
+                if best_move is None:
+                    return None
+                best_state = successors[best_move]
+                pv = [best_move] + cache_line(best_state, 'b', depth - 1)
+
+            if best_value >= WIN_VALUE // 2 or best_value <= LOSS_VALUE // 2:
+                break
+            # The next search takes longer than all the previous ones together,
+            # so it is not started past half of the time.
+            if time.perf_counter() - start > seconds / 2:
+                break
+            # The first search always completes, so there is a move to play.
+            clock = SearchClock(start + seconds)
+    except SearchTimeout:
+        pass
+    finally:
+        clock = None
+
+    return best_state
+
+def move_seconds(movetime, gametime):
+    """Returns the seconds of the next move, given the limits left of --movetime and --gametime."""
+    seconds = movetime
+    if gametime is not None:
+        share = max(gametime, 0) / gametime_moves
+        seconds = share if seconds is None else min(seconds, share)
+    return max(seconds, 0.01)
+
+def start_game(state, turn, max_depth, engine='list', movetime=None, gametime=None):
+    """
+    Plays the game from the state. Every move searches max_depth plies deep or,
+    with a movetime or a gametime in seconds, deepens iteratively up to
+    max_depth within them.
+    """
     game = [state]
     winner = ''
 
     while not winner:
-        state = find_best_move(state, turn, max_depth)
+        if movetime is not None or gametime is not None:
+            start = time.perf_counter()
+            state = iterative_deepening(state, turn, move_seconds(movetime, gametime), max_depth, engine)
+            if gametime is not None:
+                gametime -= time.perf_counter() - start
+        elif engine == 'compact':
+            state = find_best_position_move(state, turn, max_depth)
+        else:
+            state = find_best_move(state, turn, max_depth)
 
         game.append(state)
         winner = check_winner(state)
@@ -291,15 +1041,72 @@ if __name__ == '__main__':
         required=True,
         help="The output file that contains the solution."
     )
+    parser.add_argument(
+        "--tt-size",
+        type=int,
+        default=1 << 18,
+        help="The number of entries of the transposition table, 0 to search without one."
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default='list',
+        choices=['list', 'compact'],
+        help="The board representation used during the search: lists of characters copied "
+             "for every child, or one bytearray on which moves are made and unmade."
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="The search depth of every move, 10 by default. With --movetime or --gametime, "
+             "the maximum depth of iterative deepening, 64 by default."
+    )
+    parser.add_argument(
+        "--movetime",
+        type=float,
+        default=None,
+        help="The seconds every move may take. Moves are searched by iterative deepening."
+    )
+    parser.add_argument(
+        "--gametime",
+        type=float,
+        default=None,
+        help="The seconds the whole game may take, shared between its moves."
+    )
+    parser.add_argument(
+        "--ordering",
+        type=str,
+        default='tt',
+        choices=ordering_modes,
+        help="The move ordering: none searches the moves in the order they are generated, tt first "
+             "searches the principal variation and transposition table moves, full also orders the "
+             "other moves by captures, promotions, killer moves and history."
+    )
+    parser.add_argument(
+        "--ordering-stats",
+        action='store_true',
+        help="Print how many alpha-beta cutoffs the first move searched made to the standard error."
+    )
     args = parser.parse_args()
 
+    cache = TranspositionTable(args.tt_size) if args.tt_size > 0 else None
+    ordering = None if args.ordering == 'none' else MoveOrdering(args.ordering == 'full')
+
     initial_board = read_from_file(args.inputfile)
     state = State(initial_board)
     turn = 'r'
 
-    max_depth = 10
+    if args.depth is not None:
+        max_depth = args.depth
+    elif args.movetime is not None or args.gametime is not None:
+        max_depth = 64
+    else:
+        max_depth = 10
     
-    game = start_game(state, turn, max_depth)
+    game = start_game(state, turn, max_depth, args.engine, args.movetime, args.gametime)
+    if ordering is not None and args.ordering_stats:
+        print(ordering.report(), file=sys.stderr)
     generate_output(game, args.outputfile)
 
     #sys.stdout = open(args.outputfile, 'w')
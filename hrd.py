@@ -1,17 +1,142 @@
 import heapq
+import itertools
 import argparse
+import contextlib
+import json
+import mmap
+import multiprocessing
+import os
+import queue
+import sqlite3
+import struct
 import sys
+import time
+import zlib
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, SearchStats then reports no peak memory.
+    resource = None
 
 #====================================================================================
 
 char_single = '2'
+mirror_chars = str.maketrans('<>', '><')
+
+# Piece classes. Pieces of the same class are interchangeable.
+# The four classic shapes always have these classes, any other rectangle gets
+# the next free class the first time it is seen, see shape_class.
+CLASS_2_BY_2 = 0
+CLASS_SINGLE = 1
+CLASS_HORIZONTAL = 2
+CLASS_VERTICAL = 3
+
+# The cells covered by a piece of each class relative to its top left corner,
+# and the grid characters drawn on those cells.
+class_shapes = {CLASS_2_BY_2: ((0, 0), (1, 0), (0, 1), (1, 1)),
+                CLASS_SINGLE: ((0, 0),),
+                CLASS_HORIZONTAL: ((0, 0), (1, 0)),
+                CLASS_VERTICAL: ((0, 0), (0, 1))}
+class_chars = {CLASS_2_BY_2: '1111',
+               CLASS_SINGLE: char_single,
+               CLASS_HORIZONTAL: '<>',
+               CLASS_VERTICAL: '^v'}
+classic_classes = len(class_shapes)
+
+move_directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+
+# How moves are counted, see set_move_metric: 'step' moves a piece by one cell,
+# 'slide' moves it to any cell it reaches through empty cells.
+move_metrics = ['step', 'slide']
+move_metric = 'step'
+
+# shape_sizes[c] is the (width, height) of a piece of class c and
+# shape_entries[c] lists (dx, dy, cells) for every direction, where cells are
+# the cells the piece sweeps into relative to its current top left corner.
+# size_classes maps a (width, height) back to its class.
+shape_sizes = {}
+shape_entries = {}
+size_classes = {}
+
+def build_shape_tables(c):
+    """
+    Fills shape_sizes, shape_entries and size_classes for class c.
+    """
+    shape = class_shapes[c]
+    shape_sizes[c] = (max(sx for sx, sy in shape) + 1, max(sy for sx, sy in shape) + 1)
+    shape_entries[c] = []
+    for dx, dy in move_directions:
+        moved = set((sx + dx, sy + dy) for sx, sy in shape)
+        shape_entries[c].append((dx, dy, sorted(moved.difference(shape))))
+    size_classes[shape_sizes[c]] = c
+
+for c in class_shapes:
+    build_shape_tables(c)
+
+
+def shape_drawing(width, height):
+    """
+    Returns the grid characters of a width x height piece, row by row.
+    Pieces one cell thick are drawn like the 1x2 pieces, <--> and ^||v, other
+    rectangles as a box of + - | around # cells.
+    """
+    if height == 1:
+        return '<' + '-' * (width - 2) + '>'
+    if width == 1:
+        return '^' + '|' * (height - 2) + 'v'
+
+    edge = '+' + '-' * (width - 2) + '+'
+    middle = '|' + '#' * (width - 2) + '|'
+    return edge + middle * (height - 2) + edge
+
+
+def shape_class(width, height):
+    """
+    Returns the class of width x height pieces, adding a class for new shapes.
+    The masks of the bitboard layouts built so far are extended with it.
+    """
+    c = size_classes.get((width, height))
+    if c is not None:
+        return c
+
+    c = len(class_shapes)
+    class_shapes[c] = tuple((x, y) for y in range(height) for x in range(width))
+    class_chars[c] = shape_drawing(width, height)
+    build_shape_tables(c)
+    for layout in layouts.values():
+        layout.add_class(c)
+    return c
+
+
+def class_name(c):
+    """
+    Returns the name of a class used in file names: 1, 2, h and v for the
+    classic shapes and WxH for the others.
+    """
+    if c < classic_classes:
+        return class_chars[c][0].replace('<', 'h').replace('^', 'v')
+    return '{}x{}'.format(*shape_sizes[c])
+
+
+def classes_signature(bits, size):
+    """
+    Returns the shapes of the classes numbered after the classic ones, up to the
+    last class a packed board with size cells has pieces of. Class numbers of
+    such shapes depend on the order puzzles were read in, so names of files
+    keyed by packed boards include them.
+    """
+    last = (bits.bit_length() - 1) // size
+    return ''.join(['_' + class_name(c) for c in range(classic_classes, last + 1)])
 
 class Piece:
     """
     This represents a piece on the Hua Rong Dao puzzle.
     """
 
-    def __init__(self, is_2_by_2, is_single, coord_x, coord_y, orientation):
+    __slots__ = ('is_2_by_2', 'is_single', 'coord_x', 'coord_y', 'orientation', 'shape')
+
+    def __init__(self, is_2_by_2, is_single, coord_x, coord_y, orientation, shape=None):
         """
         :param is_2_by_2: True if the piece is a 2x2 piece and False otherwise.
         :type is_2_by_2: bool
@@ -24,6 +149,9 @@ class Piece:
         :param orientation: The orientation of the piece (one of 'h' or 'v') 
             if the piece is a 1x2 piece. Otherwise, this is None
         :type orientation: str
+        :param shape: The (width, height) of the piece. Only needed for shapes
+            other than 2x2, 1x1 and 1x2, see shape_piece.
+        :type shape: Optional[Tuple[int, int]]
         """
 
         self.is_2_by_2 = is_2_by_2
@@ -32,6 +160,19 @@ class Piece:
         self.coord_y = coord_y
         self.orientation = orientation
 
+        if shape is None:
+            if is_2_by_2:
+                shape = (2, 2)
+            elif is_single:
+                shape = (1, 1)
+            elif orientation == 'h':
+                shape = (2, 1)
+            else:
+                shape = (1, 2)
+        elif shape not in size_classes:
+            shape_class(*shape)
+        self.shape = shape
+
     def set_coords(self, coord_x, coord_y):
         """
         Move the piece to the new coordinates. 
@@ -47,31 +188,12 @@ class Piece:
         """
         Checks if the postion the piece wants to move is within the board
         """
-        board_width = board_width - 1
-        board_height = board_height - 1
-
-        if board_width < new_x or 0 > new_x or 0 > new_y or board_height < new_y:
-            return False
-        
-        if self.is_2_by_2:
-            if 0 <= new_x + 1 <= board_width and 0 <= new_y + 1 <= board_height:
-                return True
-            
-        elif self.is_single:
-            return True
-        
-        elif self.orientation == 'h':
-            if new_x + 1 <= board_width:
-                return True
-        elif self.orientation == 'v':
-            if new_y + 1 <= board_height:
-                return True
-
-        return False
+        shape_w, shape_h = self.shape
+        return 0 <= new_x <= board_width - shape_w and 0 <= new_y <= board_height - shape_h
     
     def __repr__(self):
-        return '{} {} {} {} {}'.format(self.is_2_by_2, self.is_single, \
-            self.coord_x, self.coord_y, self.orientation)
+        return '{} {} {} {} {} {}'.format(self.is_2_by_2, self.is_single, \
+            self.coord_x, self.coord_y, self.orientation, self.shape)
 
 
 class Board:
@@ -79,13 +201,19 @@ class Board:
     Board class for setting up the playing board.
     """
 
-    def __init__(self, height, pieces):
+    __slots__ = ('width', 'height', 'pieces', 'grid', 'blanks')
+
+    def __init__(self, height, pieces, width=4):
         """
+        :param height: The height of the board.
+        :type height: int
         :param pieces: The list of Pieces
         :type pieces: List[Piece]
+        :param width: The width of the board.
+        :type width: int
         """
 
-        self.width = 4
+        self.width = width
         self.height = height
         self.pieces = pieces
 
@@ -114,6 +242,37 @@ class Board:
 
         return False
     
+    def move_piece(self, index, new_x, new_y):
+        """
+        Returns a new board with the piece at the given index moved to (new_x, new_y).
+        Only the grid rows the piece leaves or enters are copied, the other rows are
+        shared with this board since grids are never modified once built.
+        """
+        piece = self.pieces[index]
+        new_piece = Piece(piece.is_2_by_2, piece.is_single, new_x, new_y, piece.orientation, piece.shape)
+        new_pieces = list(self.pieces)
+        new_pieces[index] = new_piece
+
+        c = piece_class(piece)
+        shape = class_shapes[c]
+        grid = list(self.grid)
+        rows = set([piece.coord_y + sy for sx, sy in shape] + [new_y + sy for sx, sy in shape])
+        for y in rows:
+            grid[y] = list(grid[y])
+
+        for sx, sy in shape:
+            grid[piece.coord_y + sy][piece.coord_x + sx] = '.'
+        for (sx, sy), ch in zip(shape, class_chars[c]):
+            grid[new_y + sy][new_x + sx] = ch
+
+        board = Board.__new__(Board)
+        board.width = self.width
+        board.height = self.height
+        board.pieces = new_pieces
+        board.grid = grid
+        board.blanks = []
+        return board
+
     # customized eq for object comparison.
     def __eq__(self, other):
         if isinstance(other, Board):
@@ -134,55 +293,443 @@ class Board:
             self.grid.append(line)
 
         for piece in self.pieces:
-            if piece.is_2_by_2:
-                self.grid[piece.coord_y][piece.coord_x] = '1'
-                self.grid[piece.coord_y][piece.coord_x + 1] = '1'
-                self.grid[piece.coord_y + 1][piece.coord_x] = '1'
-                self.grid[piece.coord_y + 1][piece.coord_x + 1] = '1'
-            elif piece.is_single:
-                self.grid[piece.coord_y][piece.coord_x] = char_single
-            else:
-                if piece.orientation == 'h':
-                    self.grid[piece.coord_y][piece.coord_x] = '<'
-                    self.grid[piece.coord_y][piece.coord_x + 1] = '>'
-                elif piece.orientation == 'v':
-                    self.grid[piece.coord_y][piece.coord_x] = '^'
-                    self.grid[piece.coord_y + 1][piece.coord_x] = 'v'
+            c = piece_class(piece)
+            for (sx, sy), ch in zip(class_shapes[c], class_chars[c]):
+                self.grid[piece.coord_y + sy][piece.coord_x + sx] = ch
       
-    def display(self):
+    def display(self, file=None):
         """
         Print out the current board.
 
+        :param file: The file to print to, sys.stdout if None.
+        :type file: Optional[TextIO]
         """
-        for i, line in enumerate(self.grid):
-            for ch in line:
-                print(ch, end='')
-            print()
+        (file or sys.stdout).write(self.to_text())
+
+    def to_text(self):
+        """
+        Returns the current board as it is displayed, one line per row.
+        """
+        return '\n'.join([''.join(line) for line in self.grid]) + '\n'
     
     def to_string(self):
         """
         Returns the current board as one string.
         """
-        str_board = ""
-        for i, line in enumerate(self.grid):
-            for ch in line:
-                str_board = str_board + ch
+        return ''.join([''.join(line) for line in self.grid])
+
+    def mirror_key(self):
+        """
+        Returns the key of this board mirrored left to right.
+        """
+        return ''.join([''.join(line[::-1]) for line in self.grid]).translate(mirror_chars)
+
+    def key(self, fold_mirror=False):
+        """
+        Returns the value used to identify this board in the explored set.
+        Pieces of the same shape are drawn with the same characters, so the
+        key does not depend on which of them sits where.
+
+        :param fold_mirror: True to give a board and its mirror the same key.
+        :type fold_mirror: bool
+        """
+        if fold_mirror:
+            return min(self.to_string(), self.mirror_key())
+        return self.to_string()
+
+
+"""
+/////Bitboard Engine/////
+"""
+# A packed board is a single int made of one anchor mask (top left corner of
+# every piece) per piece class, each mask being width * height bits wide with
+# cell (x, y) at bit y * width + x.
+
+class BitLayout:
+    """
+    Precomputed masks for packing boards of one size into ints.
+    Built once per board size and shared by every PackedBoard of that size.
+    """
+
+    def __init__(self, width, height):
+        """
+        :param width: The width of the board.
+        :type width: int
+        :param height: The height of the board.
+        :type height: int
+        """
+
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.full = (1 << self.size) - 1
+        self.coords = [(p % width, p // width) for p in range(self.size)]
+
+        # self.cell_offsets[c] are the bit offsets of the cells covered by a
+        # piece of class c relative to its anchor.
+        self.cell_offsets = {}
+        # self.moves[c] is a list of (delta, legal, entry) for every direction:
+        # delta is the bit shift of the anchor, legal the mask of anchors that
+        # stay on the board and entry the offsets of the cells the piece sweeps into.
+        self.moves = {}
+        self.mirror_rows = {}
+
+        for c in class_shapes:
+            self.add_class(c)
+
+    def add_class(self, c):
+        """
+        Builds the masks of class c for this board size.
+        """
+        width, height = self.width, self.height
+        self.cell_offsets[c] = [dy * width + dx for dx, dy in class_shapes[c]]
+        shape_w, shape_h = shape_sizes[c]
+        moves = []
+
+        for dx, dy, cells in shape_entries[c]:
+            legal = 0
+            for x in range(width - shape_w + 1):
+                for y in range(height - shape_h + 1):
+                    if 0 <= x + dx <= width - shape_w and 0 <= y + dy <= height - shape_h:
+                        legal |= 1 << (y * width + x)
+
+            entry = [ey * width + ex for ex, ey in cells]
+            moves.append((dy * width + dx, legal, entry))
+
+        self.moves[c] = moves
+
+        # self.mirror_rows[c][r] is the row of anchors r mirrored left to right.
+        rows = []
+        for r in range(1 << width):
+            mirrored = 0
+            for x in range(width - shape_w + 1):
+                if r >> x & 1:
+                    mirrored |= 1 << (width - shape_w - x)
+            rows.append(mirrored)
+        self.mirror_rows[c] = rows
+
+    def byte_size(self, bits):
+        """
+        Returns the number of bytes packed boards with the pieces of bits are
+        stored in: room for the classic classes, or up to the last class of bits.
+        """
+        classes = max(classic_classes, (bits.bit_length() + self.size - 1) // self.size)
+        return (classes * self.size + 7) // 8
+
+    def footprint(self, c, anchors):
+        """
+        Returns the mask of every cell covered by the pieces of class c.
+        """
+        cells = 0
+        for offset in self.cell_offsets[c]:
+            cells |= anchors << offset
+        return cells
+
+    def mirror(self, bits):
+        """
+        Returns the packed board mirrored left to right.
+        """
+        width, size, full = self.width, self.size, self.full
+        row_mask = (1 << width) - 1
+        mirrored = 0
+
+        for c in class_shapes:
+            rows = self.mirror_rows[c]
+            anchors = (bits >> (c * size)) & full
+            shift = c * size
+            while anchors:
+                mirrored |= rows[anchors & row_mask] << shift
+                anchors >>= width
+                shift += width
+
+        return mirrored
+
+    def occupied(self, bits):
+        """
+        Returns the mask of every occupied cell of a packed board.
+        """
+        size, full = self.size, self.full
+        cells = 0
+        for c in class_shapes:
+            cells |= self.footprint(c, (bits >> (c * size)) & full)
+        return cells
+
+
+layouts = {}
+
+def get_layout(width, height):
+    """
+    Returns the shared BitLayout for the given board size.
+    """
+    layout = layouts.get((width, height))
+    if layout is None:
+        layout = BitLayout(width, height)
+        layouts[(width, height)] = layout
+    return layout
+
+
+class PackedBoard:
+    """
+    Compact board made of a single int, see BitLayout.
+    It supports the parts of the Board interface used by the searches.
+    """
+
+    __slots__ = ('layout', 'bits')
+
+    def __init__(self, layout, bits):
+        """
+        :param layout: The masks for the size of this board.
+        :type layout: BitLayout
+        :param bits: The packed anchor masks.
+        :type bits: int
+        """
+
+        self.layout = layout
+        self.bits = bits
+
+    @property
+    def width(self):
+        return self.layout.width
+
+    @property
+    def height(self):
+        return self.layout.height
+
+    def __eq__(self, other):
+        if isinstance(other, PackedBoard):
+            return self.bits == other.bits
+        return False
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def mirror_key(self):
+        """
+        Returns the key of this board mirrored left to right.
+        """
+        return self.layout.mirror(self.bits)
+
+    def key(self, fold_mirror=False):
+        """
+        Returns the value used to identify this board in the explored set.
+
+        :param fold_mirror: True to give a board and its mirror the same key.
+        :type fold_mirror: bool
+        """
+        if fold_mirror:
+            return min(self.bits, self.layout.mirror(self.bits))
+        return self.bits
+
+    def anchors(self):
+        """
+        Returns the (x, y) anchor of every piece in the order read_from_file finds them.
+        """
+        layout = self.layout
+        size, full = layout.size, layout.full
+        mask = 0
+        for c in class_shapes:
+            mask |= (self.bits >> (c * size)) & full
+
+        anchors = []
+        while mask:
+            low = mask & -mask
+            anchors.append(layout.coords[low.bit_length() - 1])
+            mask ^= low
+        return anchors
+
+    def to_board(self):
+        """
+        Unpacks this board into a Board.
+        """
+        layout = self.layout
+        size, full = layout.size, layout.full
+        pieces = []
+
+        for x, y in self.anchors():
+            bit = 1 << (y * layout.width + x)
+            for c in class_shapes:
+                if (self.bits >> (c * size)) & full & bit:
+                    pieces.append(shape_piece(c, x, y))
+                    break
+
+        return Board(layout.height, pieces, layout.width)
+
+    def display(self, file=None):
+        self.to_board().display(file)
+
+    def to_text(self):
+        return self.to_board().to_text()
+
+    def to_string(self):
+        return self.to_board().to_string()
+
+
+def pack_board(board:Board):
+    """
+    Packs a Board into a PackedBoard.
+    """
+    layout = get_layout(board.width, board.height)
+    bits = 0
+
+    for piece in board.pieces:
+        c = piece_class(piece)
+        bits |= 1 << (c * layout.size + piece.coord_y * layout.width + piece.coord_x)
+
+    return PackedBoard(layout, bits)
+
+
+def packed_moves(board:PackedBoard):
+    """
+    Returns every move of one piece by one cell as (c, from_cell, to_cell, bits)
+    where c is the class of the moved piece and bits the packed child board.
+    Each class moves all of its pieces at once with shifts of the empty mask.
+    With the 'slide' move metric the moves of packed_slides are returned instead.
+    """
+    if move_metric == 'slide':
+        return packed_slides(board)
+
+    layout = board.layout
+    bits = board.bits
+    size, full = layout.size, layout.full
+    empty = full & ~layout.occupied(bits)
+    moves = []
+
+    for c in class_shapes:
+        shift = c * size
+        anchors = (bits >> shift) & full
+        if not anchors:
+            continue
+
+        for delta, legal, entry in layout.moves[c]:
+            movable = anchors & legal
+            for offset in entry:
+                if offset >= 0:
+                    movable &= empty >> offset
+                else:
+                    movable &= empty << -offset
+
+            while movable:
+                low = movable & -movable
+                movable ^= low
+                moved = low << delta if delta > 0 else low >> -delta
+                from_cell = low.bit_length() - 1
+                moves.append((c, from_cell, from_cell + delta, bits ^ ((low | moved) << shift)))
+
+    return moves
+
+
+def packed_slides(board:PackedBoard):
+    """
+    Returns every slide of one piece as (c, from_cell, to_cell, bits), like
+    packed_moves. A slide takes a piece to any cell it reaches by one cell steps
+    through empty cells, around corners too, and counts as one move.
+    """
+    layout = board.layout
+    bits = board.bits
+    size, full = layout.size, layout.full
+    occupied = layout.occupied(bits)
+    moves = []
+
+    for c in class_shapes:
+        shift = c * size
+        anchors = (bits >> shift) & full
+        directions = layout.moves[c]
+
+        while anchors:
+            low = anchors & -anchors
+            anchors ^= low
+            from_cell = low.bit_length() - 1
+            # The cells left by the piece are empty while it slides.
+            empty = full & ~(occupied & ~layout.footprint(c, low))
+            reached = low
+            frontier = [from_cell]
+
+            for cell in frontier:
+                for delta, legal, entry in directions:
+                    to_cell = cell + delta
+                    if not legal >> cell & 1 or reached >> to_cell & 1:
+                        continue
+                    for offset in entry:
+                        if not empty >> (cell + offset) & 1:
+                            break
+                    else:
+                        reached |= 1 << to_cell
+                        frontier.append(to_cell)
+                        moves.append((c, from_cell, to_cell, bits ^ ((low | 1 << to_cell) << shift)))
+
+    return moves
+
+
+def packed_successors(board:PackedBoard):
+    """
+    Returns every board reachable by moving one piece by one cell.
+    """
+    layout = board.layout
+    return [PackedBoard(layout, bits) for c, from_cell, to_cell, bits in packed_moves(board)]
+
+
+distance_tables = {}
+
+def packed_distance_table(goal_board:PackedBoard):
+    """
+    Returns table where table[c][cell] is the Manhattan distance from an anchor
+    of class c at cell to the nearest goal anchor of the same class.
+    Packed pieces of one class have no identity, so unlike manhanttan_distance
+    a piece is compared with the closest goal piece of its shape. The sum over
+    the pieces decomposes per piece and never overestimates the moves left.
+    """
+    layout = goal_board.layout
+    key = (layout.width, layout.height, len(class_shapes), goal_board.bits)
+    table = distance_tables.get(key)
+    if table is not None:
+        return table
+
+    table = {}
+    for c in class_shapes:
+        goal_anchors = (goal_board.bits >> (c * layout.size)) & layout.full
+        goal_coords = [layout.coords[p] for p in range(layout.size) if goal_anchors >> p & 1]
+        row = []
+        for x, y in layout.coords:
+            row.append(min([abs(x - gx) + abs(y - gy) for gx, gy in goal_coords], default=0))
+        table[c] = row
+
+    distance_tables[key] = table
+    return table
+
+
+def packed_manhattan_distance(current_board:PackedBoard, goal_board:PackedBoard):
+    """
+    Sums packed_distance_table over the pieces of the current board.
+    """
+    layout = current_board.layout
+    table = packed_distance_table(goal_board)
+    total_distance = 0
+
+    for c in class_shapes:
+        row = table[c]
+        anchors = (current_board.bits >> (c * layout.size)) & layout.full
+        while anchors:
+            low = anchors & -anchors
+            total_distance += row[low.bit_length() - 1]
+            anchors ^= low
+
+    return total_distance
 
-        return str_board
-        
 
 class State:
     """
     State class wrapping a Board with some extra current state information.
     Note that State and Board are different. Board has the locations of the pieces. 
     State has a Board and some extra information that is relevant to the search: 
-    heuristic function, f value, current depth and parent.
+    heuristic function, h value, f value, current depth and parent.
     """
 
+    __slots__ = ('board', 'hfn', 'f', 'depth', 'parent', 'h')
+
     def __lt__(self, other):
         return self.f < other.f
 
-    def __init__(self, board, hfn, f, depth, parent=None):
+    def __init__(self, board, hfn, f, depth, parent=None, h=0):
         """
         :param board: The board of the state.
         :type board: Board
@@ -194,12 +741,16 @@ class State:
         :type depth: int
         :param parent: The parent of current state.
         :type parent: Optional[State]
+        :param h: The heuristic value of current state, kept so that children
+            can update it from the one piece they move.
+        :type h: int
         """
         self.board = board
         self.hfn = hfn
         self.f = f
         self.depth = depth
         self.parent = parent
+        self.h = h
 
 
 def read_from_file(filename):
@@ -212,68 +763,124 @@ def read_from_file(filename):
     :rtype: Board
     """
 
-    puzzle_file = open(filename, "r")
+    with open(filename, "r") as puzzle_file:
+        lines = [line.rstrip() for line in puzzle_file]
+
+    # The initial board ends at the first empty line, the goal board follows.
+    if '' not in lines:
+        raise ValueError('{}: no empty line between the initial and the goal board'.format(filename))
+    blank = lines.index('')
+    rows = lines[:blank]
+    goal_rows = [line for line in lines[blank + 1:] if line]
+    if not rows or not goal_rows:
+        raise ValueError('{}: the initial or the goal board is empty'.format(filename))
+
+    width = max(len(line) for line in rows + goal_rows)
+    board = Board(len(goal_rows), grid_pieces(rows, filename + ': initial board'), width)
+    goal_board = Board(len(goal_rows), grid_pieces(goal_rows, filename + ': goal board'), width)
+    return board, goal_board
+
+
+def grid_pieces(rows, where='board'):
+    """
+    Returns the pieces drawn on the rows of a board, see shape_drawing.
+    Pieces are found in reading order from their top left character, and the
+    cells of every piece found are skipped afterwards.
 
-    line_index = 0
+    :param where: What the rows are, e.g. the file and the board they come from,
+        for the ValueError raised when a piece is not drawn completely.
+    :type where: str
+    """
     pieces = []
-    final_pieces = []
-    final = False
-    found_2by2 = False
-    finalfound_2by2 = False
-    height_ = 0
-
-    for line in puzzle_file:
-        height_ += 1
-        if line == '\n':
-            if not final:
-                height_ = 0
-                final = True
-                line_index = 0
-            continue
-        if not final: #initial board
-            for x, ch in enumerate(line):
-                if ch == '^': # found vertical piece
-                    pieces.append(Piece(False, False, x, line_index, 'v'))
-                elif ch == '<': # found horizontal piece
-                    pieces.append(Piece(False, False, x, line_index, 'h'))
-                elif ch == char_single:
-                    pieces.append(Piece(False, True, x, line_index, None))
-                elif ch == '1':
-                    if found_2by2 == False:
-                        pieces.append(Piece(True, False, x, line_index, None))
-                        found_2by2 = True
-        else: #goal board
-            for x, ch in enumerate(line):
-                if ch == '^': # found vertical piece
-                    final_pieces.append(Piece(False, False, x, line_index, 'v'))
-                elif ch == '<': # found horizontal piece
-                    final_pieces.append(Piece(False, False, x, line_index, 'h'))
-                elif ch == char_single:
-                    final_pieces.append(Piece(False, True, x, line_index, None))
-                elif ch == '1':
-                    if finalfound_2by2 == False:
-                        final_pieces.append(Piece(True, False, x, line_index, None))
-                        finalfound_2by2 = True
-        line_index += 1
-        
-    puzzle_file.close()
-    board = Board(height_, pieces)
-    goal_board = Board(height_, final_pieces)
-    return board, goal_board
+    covered = set()
 
+    def char_at(x, y):
+        return rows[y][x] if y < len(rows) and x < len(rows[y]) else ''
 
-def create_set_of_coords(piece:Piece, coord_x, coord_y):
-    piece_cords = set([(coord_x, coord_y)])
-        
-    if piece.is_2_by_2:
-        piece_cords.update([(coord_x + 1, coord_y), (coord_x, coord_y + 1), (coord_x +  1, coord_y + 1)])
-    
-    elif piece.orientation == 'h':
-        piece_cords.update([(coord_x + 1, coord_y)])
-    elif piece.orientation == 'v':
-        piece_cords.update([(coord_x, coord_y + 1)])
+    def last(x, y, dx, dy, end):
+        # The coordinate of the first end character from (x, y) on, None if the drawing stops first.
+        x, y = x + dx, y + dy
+        while char_at(x, y) not in ['', end]:
+            x, y = x + dx, y + dy
+        return (x, y) if char_at(x, y) == end else None
+
+    for y, line in enumerate(rows):
+        for x, ch in enumerate(line):
+            if (x, y) in covered:
+                continue
+
+            if ch == char_single:
+                shape = (1, 1)
+            elif ch == '1':
+                shape = (2, 2)
+            elif ch == '<':
+                end = last(x, y, 1, 0, '>')
+                shape = None if end is None else (end[0] - x + 1, 1)
+            elif ch == '^':
+                end = last(x, y, 0, 1, 'v')
+                shape = None if end is None else (1, end[1] - y + 1)
+            elif ch == '+':
+                right, bottom = last(x, y, 1, 0, '+'), last(x, y, 0, 1, '+')
+                shape = None if right is None or bottom is None else (right[0] - x + 1, bottom[1] - y + 1)
+            else:
+                continue
+
+            if shape is not None:
+                c = size_classes.get(shape)
+                drawing = shape_drawing(*shape) if c is None else class_chars[c]
+            if shape is None or any(char_at(x + i % shape[0], y + i // shape[0]) != d
+                                    for i, d in enumerate(drawing)):
+                raise ValueError('{}, row {}, column {}: the piece starting with {!r} is not drawn completely'.format(
+                    where, y + 1, x + 1, ch))
+
+            pieces.append(shape_piece(shape_class(*shape), x, y))
+            covered.update((x + sx, y + sy) for sx in range(shape[0]) for sy in range(shape[1]))
+
+    return pieces
+
+
+def shape_piece(c, x, y):
+    """
+    Returns a Piece of class c at (x, y).
+    """
+    shape = shape_sizes[c]
+    orientation = None
+    if shape[1] == 1 and shape[0] > 1:
+        orientation = 'h'
+    elif shape[0] == 1 and shape[1] > 1:
+        orientation = 'v'
+    return Piece(shape == (2, 2), shape == (1, 1), x, y, orientation, shape)
+
+
+def piece_class(piece:Piece):
+    """
+    Returns the class of the given piece.
+    """
+    return size_classes[piece.shape]
+
+
+def board_from_key(key, width, height):
+    """
+    Rebuilds a Board from the string returned by Board.key().
+    """
+    rows = [key[y * width:(y + 1) * width] for y in range(height)]
+    return Board(height, grid_pieces(rows), width)
 
-    return piece_cords
+
+def key_decoder(board:Board):
+    """
+    Returns a function turning a key() of a board like the given one back into a board.
+    """
+    if isinstance(board, PackedBoard):
+        layout = board.layout
+        return lambda key: PackedBoard(layout, key)
+
+    width, height = board.width, board.height
+    return lambda key: board_from_key(key, width, height)
+
+
+def create_set_of_coords(piece:Piece, coord_x, coord_y):
+    return set([(coord_x + sx, coord_y + sy) for sx, sy in class_shapes[piece_class(piece)]])
 
 
 def grid_to_string(grid):
@@ -288,193 +895,2524 @@ def is_goal_state(current_board:Board, goal_board:Board):
     """
     Takes the current state of the board and returns TRUE if it matches the goal state of the baord.
     """
-    if current_board.__eq__(goal_board):
+    if current_board.key() == goal_board.key():
         return True
     
     return False
 
-def dfs_generate_successors(current_state:State):
-    successor_states = []
-    current_board = current_state.board
+def goal_allows_mirror(goal_board:Board):
+    """
+    Returns TRUE if the goal board is its own mirror image. A board and its mirror are
+    then the same distance from the goal, so the searches can explore only one of them.
+    """
+    return goal_board.key() == goal_board.mirror_key()
 
-    width, height = current_board.width, current_board.height
 
-    for piece in current_board.pieces:
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+class SearchBudgetExceeded(Exception):
+    """
+    Raised by SearchBudget.expand when a search runs out of nodes or time,
+    with the budget that ran out, whose statistics a SearchStats still has.
+    """
 
-        for dx, dy in directions:
-            new_x = piece.coord_x + dx
-            new_y = piece.coord_y + dy
+    def __init__(self, reason, budget=None):
+        super().__init__(reason)
+        self.budget = budget
 
-            if piece.is_within_board(new_x, new_y, width, height):
 
-                if not current_board.is_occupied(new_x, new_y, piece):
-                    new_pieces = [p for p in current_board.pieces]
-                    new_piece = Piece(piece.is_2_by_2, piece.is_single, new_x, new_y, piece.orientation)
-                    new_pieces[current_board.pieces.index(piece)] = new_piece
+class SearchBudget:
+    """
+    Counts the nodes a search expands and stops the search once it has expanded
+    max_nodes nodes or run for timeout seconds. Searches take an optional budget
+    and only call expand() when one is given.
+    """
 
-                    new_board = Board(current_board.height, new_pieces)
-                    successor_states.append(State(new_board, None, None, 1, current_state))
+    __slots__ = ('max_nodes', 'deadline', 'nodes')
 
-    return successor_states
+    def __init__(self, max_nodes=None, timeout=None):
+        """
+        :param max_nodes: The maximum number of expanded nodes, None for no limit.
+        :type max_nodes: Optional[int]
+        :param timeout: The maximum number of seconds, None for no limit.
+        :type timeout: Optional[float]
+        """
+        self.max_nodes = max_nodes
+        self.deadline = None if timeout is None else time.perf_counter() + timeout
+        self.nodes = 0
 
+    def expand(self):
+        """
+        Called by the searches for every expanded node.
+        """
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchBudgetExceeded('node budget', self)
+        self.nodes += 1
 
-def DFSearch(initial_state, goal_state):
-    frontier = [initial_state]
-    explored = set()
+        # Reading the clock is slower than expanding a node, so it is done every 256 nodes.
+        if self.deadline is not None and self.nodes & 255 == 0 and time.perf_counter() > self.deadline:
+            raise SearchBudgetExceeded('timeout', self)
 
-    while frontier:
-        curr_state = frontier.pop()
-        
-        str_board = curr_state.board.to_string()
-        if str_board not in explored:
-            explored.add(str_board)
+    def record(self, generated, duplicates, frontier):
+        """
+        Called by the searches with the children generated, how many of them were
+        duplicates of boards already reached and the size of the frontier.
+        Only SearchStats keeps them.
+        """
 
-            if curr_state.board.__eq__(goal_state.board):
-                return curr_state
-        
-            frontier =  frontier + dfs_generate_successors(curr_state)
 
-    return None
+class SearchStats(SearchBudget):
+    """
+    A SearchBudget that also keeps statistics of the search: nodes expanded and
+    generated, duplicate hits, peak frontier size and the time spent in each
+    phase of solving a puzzle. Searches without a budget pay nothing for them.
+    """
 
+    __slots__ = ('generated', 'duplicates', 'peak_frontier', 'phases', 'start', 'progress', 'every')
 
-def generate_output(state:State, outputfile):
-    results = []
+    def __init__(self, max_nodes=None, timeout=None, progress=None, every=10000):
+        """
+        :param progress: Called as progress(stats) every `every` expanded nodes.
+        :type progress: Optional[Callable]
+        :param every: The number of expanded nodes between progress calls.
+        :type every: int
+        """
+        super().__init__(max_nodes, timeout)
+        self.generated = 0
+        self.duplicates = 0
+        self.peak_frontier = 0
+        self.phases = {}
+        self.start = time.perf_counter()
+        self.progress = progress
+        self.every = every
+
+    def expand(self):
+        SearchBudget.expand(self)
+        if self.progress is not None and self.nodes % self.every == 0:
+            self.progress(self)
+
+    def record(self, generated, duplicates, frontier):
+        self.generated += generated
+        self.duplicates += duplicates
+        if frontier > self.peak_frontier:
+            self.peak_frontier = frontier
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Adds the time spent in the with block to the phase called name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
 
-    while state.parent != None:
-        results.append(state.board)
+    def to_dict(self):
+        """
+        Returns the statistics as a dict of plain values, for json.
+        """
+        stats = {'expanded': self.nodes,
+                 'generated': self.generated,
+                 'duplicates': self.duplicates,
+                 'duplicate_rate': round(self.duplicates / self.generated, 4) if self.generated else 0.0,
+                 'peak_frontier': self.peak_frontier,
+                 'seconds': round(time.perf_counter() - self.start, 4),
+                 'phases': dict((name, round(seconds, 4)) for name, seconds in self.phases.items())}
+        if resource is not None:
+            # Kilobytes on Linux, bytes on macOS.
+            stats['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return stats
+
+    def report(self):
+        """
+        Returns the statistics as one line of text.
+        """
+        stats = self.to_dict()
+        phases = ' '.join(['{}={:.3f}s'.format(name, seconds) for name, seconds in stats.pop('phases').items()])
+        return ' '.join(['{}={}'.format(name, value) for name, value in stats.items()] + [phases])
 
-        state = state.parent
 
-        if state.parent == None:
-            results.append(state.board)
+def search_phase(budget, name):
+    """
+    Returns a context manager timing the phase called name if budget keeps statistics.
+    """
+    if isinstance(budget, SearchStats):
+        return budget.phase(name)
+    return contextlib.nullcontext()
 
+def grid_moves(board:Board):
+    """
+    Returns every move of one piece by one cell as (index, new_x, new_y).
+    The grid of the board is used as the occupancy map, so a move only looks at
+    the cells the piece sweeps into.
+    With the 'slide' move metric the moves of grid_slides are returned instead.
+    """
+    if move_metric == 'slide':
+        return grid_slides(board)
 
-    with open(outputfile, 'w') as sys.stdout:
-        
-        for board in results[::-1]:
-            board.display()
-            print("")
+    moves = []
+    width, height = board.width, board.height
+    grid = board.grid
 
-    return None
+    for index, piece in enumerate(board.pieces):
+        c = piece_class(piece)
+        shape_w, shape_h = shape_sizes[c]
+        x, y = piece.coord_x, piece.coord_y
 
-"""
-/////A* Functions///// 
-"""
-def cost_function(parent_state:State):
-    cost = 0
+        for dx, dy, cells in shape_entries[c]:
+            new_x = x + dx
+            new_y = y + dy
 
-    return cost
+            if 0 <= new_x <= width - shape_w and 0 <= new_y <= height - shape_h:
+                for ex, ey in cells:
+                    if grid[y + ey][x + ex] != '.':
+                        break
+                else:
+                    moves.append((index, new_x, new_y))
 
-def manhanttan_distance(current_board:Board, goal_board:Board):
-    total_distance = 0
+    return moves
 
-    for current_piece, goal_piece in zip(current_board.pieces, goal_board.pieces):
-        current_x, current_y = current_piece.coord_x, current_piece.coord_y       
-        goal_x, goal_y = goal_piece.coord_x, goal_piece.coord_y
-        
-        distance = abs(current_x - goal_x) + abs(current_y - goal_y)
-        
-        total_distance += distance
 
-    return total_distance
+def grid_slides(board:Board):
+    """
+    Returns every slide of one piece as (index, new_x, new_y), like grid_moves.
+    A slide takes a piece to any cell it reaches by one cell steps through empty
+    cells, around corners too, and counts as one move.
+    """
+    moves = []
+    width, height = board.width, board.height
+    grid = board.grid
+
+    for index, piece in enumerate(board.pieces):
+        c = piece_class(piece)
+        shape_w, shape_h = shape_sizes[c]
+        start = (piece.coord_x, piece.coord_y)
+        # The cells left by the piece are empty while it slides.
+        own = set((start[0] + sx, start[1] + sy) for sx, sy in class_shapes[c])
+        reached = set([start])
+        frontier = [start]
+
+        for x, y in frontier:
+            for dx, dy, cells in shape_entries[c]:
+                new_x = x + dx
+                new_y = y + dy
+
+                if (new_x, new_y) not in reached and 0 <= new_x <= width - shape_w and 0 <= new_y <= height - shape_h:
+                    for ex, ey in cells:
+                        if grid[y + ey][x + ex] != '.' and (x + ex, y + ey) not in own:
+                            break
+                    else:
+                        reached.add((new_x, new_y))
+                        frontier.append((new_x, new_y))
+                        moves.append((index, new_x, new_y))
+
+    return moves
+
+
+def grid_successors(board:Board):
+    """
+    Returns every board reachable by moving one piece by one cell.
+    """
+    return [board.move_piece(index, new_x, new_y) for index, new_x, new_y in grid_moves(board)]
 
 
-def a_star_generate_successors(current_state:State, goal_state:State):
-    successor_states = []
-    current_board = current_state.board
+def set_move_metric(metric):
+    """
+    Chooses how every search counts moves: 'step' moves one piece by one cell,
+    'slide' moves one piece any number of cells through empty cells, which is
+    how the moves of the puzzle are usually counted.
+    """
+    global move_metric
+    if metric not in move_metrics:
+        raise ValueError('unknown move metric {}'.format(metric))
+    move_metric = metric
 
-    width, height = current_board.width, current_board.height
 
-    for piece in current_board.pieces:
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+def board_successors(board:Board):
+    """
+    Returns every board reachable in one move from a Board or PackedBoard.
+    """
+    if isinstance(board, PackedBoard):
+        return packed_successors(board)
+    return grid_successors(board)
 
-        for dx, dy in directions:
-            new_x = piece.coord_x + dx
-            new_y = piece.coord_y + dy
 
-            if piece.is_within_board(new_x, new_y, width, height):
+def dfs_successor_states(current_state:State):
+    """
+    Lazily yields the children of a state, last move first, which is the order the
+    depth first search visits them in. Moves are cheap to list, the child boards
+    are only built when the search reaches them.
+    """
+    board = current_state.board
+    depth = current_state.depth + 1
 
-                if not current_board.is_occupied(new_x, new_y, piece):
-                    new_pieces = [p for p in current_board.pieces]
-                    new_piece = Piece(piece.is_2_by_2, piece.is_single, new_x, new_y, piece.orientation)
-                    new_pieces[current_board.pieces.index(piece)] = new_piece
+    if isinstance(board, PackedBoard):
+        layout = board.layout
+        for c, from_cell, to_cell, bits in reversed(packed_moves(board)):
+            yield State(PackedBoard(layout, bits), None, None, depth, current_state)
+    else:
+        for index, new_x, new_y in reversed(grid_moves(board)):
+            yield State(board.move_piece(index, new_x, new_y), None, None, depth, current_state)
 
-                    #current_board.display()
 
-                    new_board = Board(current_board.height, new_pieces)
-                    #new_board.display()
+def depth_first_search(initial_state, goal_state, depth_limit=None, budget=None):
+    """
+    Depth first search keeping a stack of child iterators, one per level of the
+    current path. Returns the goal state or None, and True if a state was not
+    expanded because of depth_limit.
 
-                    h = manhanttan_distance(new_board, goal_state.board)
-                    g = current_state.depth + 1
+    With a depth limit a state may be reached again by a shorter path that can go
+    deeper, so explored keeps the smallest depth each state was expanded at.
+    """
+    fold_mirror = goal_allows_mirror(goal_state.board)
+    explored = {initial_state.board.key(fold_mirror): initial_state.depth}
+    cutoff = False
 
-                    new_state = State(new_board, None, h + g, g, current_state)
-                    successor_states.append(new_state)
+    if is_goal_state(initial_state.board, goal_state.board):
+        return initial_state, cutoff
 
-    return successor_states
+    if budget is not None:
+        budget.expand()
+    stack = [dfs_successor_states(initial_state)]
 
+    while stack:
+        curr_state = next(stack[-1], None)
 
-def AStarsearch(initial_state, goal_state):
-    frontier = []
-    heapq.heapify(frontier)
-    heapq.heappush(frontier, initial_state)
+        if curr_state is None:
+            stack.pop()
+            continue
 
-    explored = set()
+        str_board = curr_state.board.key(fold_mirror)
+        depth = explored.get(str_board)
+        if depth is not None and (depth_limit is None or depth <= curr_state.depth):
+            if budget is not None:
+                budget.record(1, 1, len(stack))
+            continue
+        explored[str_board] = curr_state.depth
+        if budget is not None:
+            budget.record(1, 0, len(stack))
 
-    while frontier:
-        curr_state = heapq.heappop(frontier)
+        if is_goal_state(curr_state.board, goal_state.board):
+            return curr_state, cutoff
+
+        if depth_limit is None or curr_state.depth < depth_limit:
+            if budget is not None:
+                budget.expand()
+            stack.append(dfs_successor_states(curr_state))
+        else:
+            cutoff = True
+
+    return None, cutoff
+
+
+def DFSearch(initial_state, goal_state, depth_limit=None, budget=None):
+    """
+    :param depth_limit: The maximum depth explored, None for no limit.
+    :type depth_limit: Optional[int]
+    :param budget: The limits of the search, None for no limit.
+    :type budget: Optional[SearchBudget]
+    """
+    return depth_first_search(initial_state, goal_state, depth_limit, budget)[0]
+
+
+def IDDFSearch(initial_state, goal_state, max_depth=None, budget=None):
+    """
+    Iterative deepening: depth limited searches with limits 0, 1, 2, ... until the
+    goal is found, or a search finishes without cutting anything off.
+
+    :param max_depth: The largest depth limit tried, None for no limit.
+    :type max_depth: Optional[int]
+    """
+    depth_limit = 0
+
+    while max_depth is None or depth_limit <= max_depth:
+        result, cutoff = depth_first_search(initial_state, goal_state, depth_limit, budget)
+        if result is not None or not cutoff:
+            return result
+        depth_limit += 1
+
+    return None
+
+
+output_formats = ['boards', 'moves']
+output_buffer = 1 << 16
+
+
+def solution_moves(boards):
+    """
+    Returns the moves between consecutive boards of a solution as (piece,
+    direction) tuples. A piece is numbered by its index in the pieces of the
+    first board, in the order read_from_file finds them, and keeps its number
+    as it moves. The direction is one letter of L, R, U or D per cell moved,
+    horizontal ones first, so a slide around a corner reads e.g. "LU".
+
+    :param boards: The boards of the solution, Board or PackedBoard.
+    :type boards: List
+    :rtype: List[Tuple[int, str]]
+    """
+    boards = [b.to_board() if isinstance(b, PackedBoard) else b for b in boards]
+    if not boards:
+        return []
+
+    ids = {(p.shape, p.coord_x, p.coord_y): i for i, p in enumerate(boards[0].pieces)}
+    moves = []
+
+    for board in boards[1:]:
+        cells = set([(p.shape, p.coord_x, p.coord_y) for p in board.pieces])
+        (shape, old_x, old_y), = [cell for cell in ids if cell not in cells]
+        (_, new_x, new_y), = [cell for cell in cells if cell not in ids]
+
+        dx, dy = new_x - old_x, new_y - old_y
+        piece = ids.pop((shape, old_x, old_y))
+        ids[(shape, new_x, new_y)] = piece
+        moves.append((piece, ('R' if dx > 0 else 'L') * abs(dx) + ('D' if dy > 0 else 'U') * abs(dy)))
+
+    return moves
+
+
+def generate_output(state:State, outputfile, output_format='boards', stream=False):
+    """
+    Writes the solution ending at the given state to the output file.
+
+    The 'boards' format writes every board of the path followed by an empty
+    line. The 'moves' format writes the first board, an empty line and then one
+    move per line: the piece number and its direction (see solution_moves),
+    e.g. "3 L" or, for a slide, "7 DD".
+
+    :param output_format: One of output_formats.
+    :type output_format: str
+    :param stream: True to write each board as soon as its text is built
+        instead of joining the whole solution into one string first.
+    :type stream: bool
+    """
+    results = []
+
+    while state != None:
+        results.append(state.board)
+
+        state = state.parent
+
+    results.reverse()
+
+    with open(outputfile, 'w', buffering=output_buffer) as output:
+        if output_format == 'moves':
+            lines = ['{} {}'.format(piece, direction) for piece, direction in solution_moves(results)]
+            if results:
+                output.write(results[0].to_text() + '\n')
+            output.write(''.join([line + '\n' for line in lines]))
+
+        elif stream:
+            for board in results:
+                output.write(board.to_text())
+                output.write('\n')
+
+        else:
+            output.write(''.join([board.to_text() + '\n' for board in results]))
+
+    return None
+
+"""
+/////A* Functions///// 
+"""
+def cost_function(parent_state:State):
+    cost = 0
+
+    return cost
+
+def manhanttan_distance(current_board:Board, goal_board:Board):
+    total_distance = 0
+
+    for current_piece, goal_piece in zip(current_board.pieces, goal_board.pieces):
+        current_x, current_y = current_piece.coord_x, current_piece.coord_y       
+        goal_x, goal_y = goal_piece.coord_x, goal_piece.coord_y
+        
+        distance = abs(current_x - goal_x) + abs(current_y - goal_y)
         
-        if curr_state.board.__eq__(goal_state.board):
-            return curr_state
+        total_distance += distance
+
+    return total_distance
+
+
+def manhattan_move_delta(piece:Piece, goal_board:Board, index, new_x, new_y):
+    """
+    Returns the change of manhanttan_distance when the piece at the given index moves
+    to (new_x, new_y). Only the term of the moved piece changes.
+    """
+    if index >= len(goal_board.pieces):
+        return 0
+
+    goal_piece = goal_board.pieces[index]
+    goal_x, goal_y = goal_piece.coord_x, goal_piece.coord_y
+
+    return (abs(new_x - goal_x) + abs(new_y - goal_y)
+            - abs(piece.coord_x - goal_x) - abs(piece.coord_y - goal_y))
+
+
+def class_anchor_masks(board:Board):
+    """
+    Returns the anchor mask of every piece class of a Board or PackedBoard,
+    with cell (x, y) at bit y * width + x.
+    """
+    if isinstance(board, PackedBoard):
+        layout = board.layout
+        return [(board.bits >> (c * layout.size)) & layout.full for c in class_shapes]
+
+    masks = [0 for c in class_shapes]
+    for piece in board.pieces:
+        masks[piece_class(piece)] |= 1 << (piece.coord_y * board.width + piece.coord_x)
+    return masks
+
+
+def min_cost_assignment(costs):
+    """
+    Returns the minimum total cost of matching every row of costs to a different column.
+    Solved by dynamic programming over the sets of used columns, which is fast for
+    the handful of pieces of one shape. There must be no more rows than columns.
+    """
+    best = {0: 0}
+
+    for row in costs:
+        next_best = {}
+        for used, total in best.items():
+            for j, cost in enumerate(row):
+                if not used >> j & 1:
+                    key = used | 1 << j
+                    if total + cost < next_best.get(key, total + cost + 1):
+                        next_best[key] = total + cost
+        best = next_best
+
+    return min(best.values())
+
+
+class Heuristic:
+    """
+    Base class of the A* heuristics, stored in State.hfn.
+    A heuristic is built for one goal board and estimates the number of moves
+    left from any board of the same size, packed or not.
+    """
+
+    def __init__(self, goal_board):
+        """
+        :param goal_board: The goal board.
+        :type goal_board: Board
+        """
+        self.goal_board = goal_board
+
+    def value(self, board):
+        """
+        Computes the heuristic of a board from scratch.
+        """
+        raise NotImplementedError
+
+    def child_value(self, state, move, child_board):
+        """
+        Computes the heuristic of child_board, reached from state by move.
+        move is the entry of grid_moves or packed_moves that produced the child.
+        Heuristics that decompose per piece override this to update state.h.
+        """
+        return self.value(child_board)
+
+
+class ManhattanHeuristic(Heuristic):
+    """
+    manhanttan_distance on grid boards and packed_manhattan_distance on packed boards.
+    """
+
+    def value(self, board):
+        if isinstance(board, PackedBoard):
+            return packed_manhattan_distance(board, self.goal_board)
+        return manhanttan_distance(board, self.goal_board)
+
+    def child_value(self, state, move, child_board):
+        if isinstance(child_board, PackedBoard):
+            c, from_cell, to_cell, bits = move
+            table = packed_distance_table(self.goal_board)
+            return state.h + table[c][to_cell] - table[c][from_cell]
+
+        index, new_x, new_y = move
+        piece = state.board.pieces[index]
+        return state.h + manhattan_move_delta(piece, self.goal_board, index, new_x, new_y)
+
+
+class NearestHeuristic(Heuristic):
+    """
+    Sum over the pieces of the distance to the nearest goal piece of the same shape.
+    Admissible, and updated per piece on both engines.
+    """
+
+    def __init__(self, goal_board):
+        super().__init__(goal_board)
+        packed_goal = goal_board if isinstance(goal_board, PackedBoard) else pack_board(goal_board)
+        self.table = packed_distance_table(packed_goal)
+
+    def value(self, board):
+        total_distance = 0
+        for c, anchors in enumerate(class_anchor_masks(board)):
+            row = self.table[c]
+            while anchors:
+                low = anchors & -anchors
+                total_distance += row[low.bit_length() - 1]
+                anchors ^= low
+        return total_distance
+
+    def child_value(self, state, move, child_board):
+        if isinstance(child_board, PackedBoard):
+            c, from_cell, to_cell, bits = move
+        else:
+            index, new_x, new_y = move
+            piece = state.board.pieces[index]
+            c = piece_class(piece)
+            from_cell = piece.coord_y * child_board.width + piece.coord_x
+            to_cell = new_y * child_board.width + new_x
+
+        return state.h + self.table[c][to_cell] - self.table[c][from_cell]
+
+
+class AssignmentHeuristic(Heuristic):
+    """
+    For every shape, matches the pieces to the goal pieces of that shape with the
+    minimum total Manhattan distance, and sums the matchings.
+    Each move changes the matching of one shape by at most one, so the heuristic
+    is admissible and consistent. The cost of a shape only depends on where its
+    pieces are, so it is cached per anchor mask.
+    """
+
+    def __init__(self, goal_board):
+        super().__init__(goal_board)
+        self.width = goal_board.width
+        self.goal_coords = []
+        for anchors in class_anchor_masks(goal_board):
+            self.goal_coords.append(self.coords(anchors))
+        self.cache = {}
+
+    def coords(self, anchors):
+        """
+        Returns the (x, y) of every anchor of a mask.
+        """
+        coords = []
+        while anchors:
+            low = anchors & -anchors
+            p = low.bit_length() - 1
+            coords.append((p % self.width, p // self.width))
+            anchors ^= low
+        return coords
+
+    def class_cost(self, c, anchors):
+        """
+        Returns the cost of the best matching of the pieces of class c to their goals.
+        """
+        cost = self.cache.get((c, anchors))
+        if cost is not None:
+            return cost
+
+        pieces = self.coords(anchors)
+        goals = self.goal_coords[c]
+        if len(pieces) > len(goals):
+            pieces, goals = goals, pieces
+
+        if pieces:
+            costs = [[abs(x - gx) + abs(y - gy) for gx, gy in goals] for x, y in pieces]
+            cost = min_cost_assignment(costs)
+        else:
+            cost = 0
+
+        self.cache[(c, anchors)] = cost
+        return cost
+
+    def value(self, board):
+        total_distance = 0
+        for c, anchors in enumerate(class_anchor_masks(board)):
+            total_distance += self.class_cost(c, anchors)
+        return total_distance
+
+    def child_value(self, state, move, child_board):
+        if not isinstance(child_board, PackedBoard):
+            return self.value(child_board)
+
+        # Only the class of the moved piece changes its matching.
+        c, from_cell, to_cell, bits = move
+        layout = child_board.layout
+        shift = c * layout.size
+        before = (state.board.bits >> shift) & layout.full
+        after = (bits >> shift) & layout.full
+        return state.h - self.class_cost(c, before) + self.class_cost(c, after)
+
+
+pdb_magic = b'HRDPDB1\n'
+pdb_unreachable = 255
+pdb_max_size = 1 << 24
+
+def combination_rank(anchors):
+    """
+    Returns the rank of a set of cells among all sets of the same size, in the
+    combinatorial number system. Ranks of k cells out of n are 0 to C(n, k) - 1.
+    """
+    rank = 0
+    i = 1
+    while anchors:
+        low = anchors & -anchors
+        rank += comb(low.bit_length() - 1, i)
+        anchors ^= low
+        i += 1
+    return rank
+
+
+def comb(n, k):
+    if k > n:
+        return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+class PatternDatabase:
+    """
+    Exact distances to the goal for an abstraction of the board that keeps only
+    the pieces of some classes (the pattern) and removes the others.
+    Every real move moves at most one pattern piece by one cell, so the
+    distance of the abstraction is a lower bound of the real distance.
+
+    The table has one byte per placement of the pattern pieces, indexed by the
+    combination ranks of the anchors of every pattern class, and is kept in a
+    file so that later runs only have to map it into memory.
+    """
+
+    def __init__(self, goal_board:PackedBoard, pattern, path, budget=None):
+        """
+        :param goal_board: The goal board.
+        :type goal_board: PackedBoard
+        :param pattern: The classes of the pattern pieces.
+        :type pattern: List[int]
+        :param path: The file the table is loaded from, or built into if missing.
+        :type path: str
+        :param budget: The limits of the search the table is built for, which
+            the abstract boards expanded by the build count against.
+        :type budget: Optional[SearchBudget]
+        """
+        layout = goal_board.layout
+        self.layout = layout
+        self.pattern = sorted(pattern)
+        self.goal_bits = self.abstract(goal_board.bits)
+
+        # self.strides[c] is the weight of the rank of class c in the table index.
+        self.strides = {}
+        for i, c in enumerate(self.pattern):
+            self.strides[c] = pdb_table_size(goal_board, self.pattern[:i])
+        self.size = pdb_table_size(goal_board, self.pattern)
+
+        if self.size > pdb_max_size:
+            raise ValueError('a pattern database of {} entries is too large, use fewer pieces'.format(self.size))
+
+        self.ranks = {}
+        self.header = self.build_header()
+
+        if not os.path.exists(path):
+            self.save(path, self.build(budget))
+        self.load(path)
+
+    def abstract(self, bits):
+        """
+        Removes the pieces that are not in the pattern from a packed board.
+        """
+        layout = self.layout
+        abstract_bits = 0
+        for c in self.pattern:
+            abstract_bits |= bits & (layout.full << (c * layout.size))
+        return abstract_bits
+
+    def index(self, bits):
+        """
+        Returns the position of the abstraction of a packed board in the table.
+        """
+        layout = self.layout
+        index = 0
+        for c in self.pattern:
+            anchors = (bits >> (c * layout.size)) & layout.full
+            rank = self.ranks.get(anchors)
+            if rank is None:
+                rank = combination_rank(anchors)
+                self.ranks[anchors] = rank
+            index += rank * self.strides[c]
+        return index
+
+    def build(self, budget=None):
+        """
+        Retrograde breadth first search from the goal pattern. Moves are reversible,
+        so expanding forward from the goal gives the distances to the goal.
+        """
+        table = bytearray([pdb_unreachable]) * self.size
+        table[self.index(self.goal_bits)] = 0
+        frontier = [self.goal_bits]
+        distance = 0
+
+        while frontier:
+            distance = min(distance + 1, pdb_unreachable - 1)
+            next_frontier = []
+            for bits in frontier:
+                if budget is not None:
+                    budget.expand()
+                for c, from_cell, to_cell, child in packed_moves(PackedBoard(self.layout, bits)):
+                    index = self.index(child)
+                    if table[index] == pdb_unreachable:
+                        table[index] = distance
+                        next_frontier.append(child)
+            frontier = next_frontier
+
+        return table
+
+    def build_header(self):
+        layout = self.layout
+        goal = self.goal_bits.to_bytes(layout.byte_size(self.goal_bits), 'little')
+        return pdb_magic + struct.pack('<III', layout.width, layout.height, len(goal)) + goal
+
+    def save(self, path, table):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Written next to the final file and renamed, so a reader never sees half a table.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(self.header)
+            f.write(table)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(self.header)] != self.header or len(self.mmap) != len(self.header) + self.size:
+            raise ValueError('{} is not a pattern database for this goal board'.format(path))
+        self.offset = len(self.header)
+
+    def distance(self, bits):
+        """
+        Returns the distance of the abstraction of a packed board to the goal pattern.
+        """
+        return self.mmap[self.offset + self.index(bits)]
+
+
+def pdb_table_size(goal_board:PackedBoard, pattern):
+    """
+    Returns the number of entries of the pattern database of a goal board and pattern.
+    """
+    layout = goal_board.layout
+    size = 1
+    for c in pattern:
+        count = bin((goal_board.bits >> (c * layout.size)) & layout.full).count('1')
+        size *= comb(layout.size, count)
+    return size
+
+
+def default_pdb_pattern(goal_board:PackedBoard, max_size=1 << 21):
+    """
+    Returns the 2x2 piece plus every blocker class, singles first, that keeps
+    the pattern database under max_size entries.
+    Goals without a 2x2 piece start from their first class.
+    """
+    layout = goal_board.layout
+    present = [c for c in class_shapes if (goal_board.bits >> (c * layout.size)) & layout.full]
+    if CLASS_2_BY_2 in present:
+        present.remove(CLASS_2_BY_2)
+        present.insert(0, CLASS_2_BY_2)
+
+    pattern = present[:1]
+    for c in present[1:]:
+        if pdb_table_size(goal_board, pattern + [c]) <= max_size:
+            pattern.append(c)
+    return pattern
+
+
+def parse_pdb_pattern(text):
+    """
+    Returns the classes of a --pdb-pattern: comma separated tokens, each either
+    the class_name of one class (1, 2, h, v or WxH) or a run of the characters
+    of classic pieces (any of 1, 2, < and ^), e.g. "12<" or "1,3x1".
+    """
+    classic = dict((class_chars[c][0], c) for c in range(classic_classes))
+    pattern = set()
+
+    for token in text.split(','):
+        token = token.strip()
+        named = [c for c in class_shapes if class_name(c) == token]
+        if named:
+            pattern.update(named)
+        elif token and all(ch in classic for ch in token):
+            pattern.update(classic[ch] for ch in token)
+        else:
+            raise ValueError('unknown piece in --pdb-pattern: {!r}'.format(token))
+
+    return sorted(pattern)
+
+
+def pdb_path(goal_board:PackedBoard, pattern, directory):
+    """
+    Returns the file of the pattern database of a goal board and pattern.
+    Databases of the 'slide' move metric get their own files.
+    """
+    layout = goal_board.layout
+    name = ''.join([class_name(c) for c in sorted(pattern)])
+    metric = '' if move_metric == 'step' else '_' + move_metric
+    return os.path.join(directory, 'pdb_{}x{}_{}_{:x}{}{}.bin'.format(
+        layout.width, layout.height, name, goal_board.bits,
+        classes_signature(goal_board.bits, layout.size), metric))
+
+
+class PatternDatabaseHeuristic(Heuristic):
+    """
+    The maximum of a PatternDatabase lookup and NearestHeuristic, or
+    MisplacedHeuristic with the 'slide' move metric.
+    """
+
+    def __init__(self, goal_board, pattern=None, directory='pdb', budget=None):
+        """
+        :param pattern: The classes kept in the pattern database, see default_pdb_pattern.
+        :type pattern: Optional[List[int]]
+        :param directory: The directory of the pattern database files.
+        :type directory: str
+        :param budget: The limits of the search, which also apply to building the database.
+        :type budget: Optional[SearchBudget]
+        """
+        super().__init__(goal_board)
+        packed_goal = goal_board if isinstance(goal_board, PackedBoard) else pack_board(goal_board)
+        if pattern is None:
+            pattern = default_pdb_pattern(packed_goal)
+        self.pdb = PatternDatabase(packed_goal, pattern, pdb_path(packed_goal, pattern, directory), budget)
+        if move_metric == 'slide':
+            self.nearest = MisplacedHeuristic(goal_board)
+        else:
+            self.nearest = NearestHeuristic(goal_board)
+
+    def value(self, board):
+        bits = board.bits if isinstance(board, PackedBoard) else pack_board(board).bits
+        return max(self.pdb.distance(bits), self.nearest.value(board))
+
+
+class MisplacedHeuristic(Heuristic):
+    """
+    The number of goal pieces not covered by a piece of the same shape.
+    A move, even a slide, moves one piece, so it is admissible with both move
+    metrics, where the distance heuristics only are with the 'step' metric.
+    """
+
+    def __init__(self, goal_board):
+        super().__init__(goal_board)
+        self.width = goal_board.width
+        self.goal_masks = class_anchor_masks(goal_board)
+
+    def value(self, board):
+        total = 0
+        for goal, anchors in zip(self.goal_masks, class_anchor_masks(board)):
+            total += bin(goal & ~anchors).count('1')
+        return total
+
+    def child_value(self, state, move, child_board):
+        if isinstance(child_board, PackedBoard):
+            c, from_cell, to_cell, bits = move
+        else:
+            index, new_x, new_y = move
+            piece = state.board.pieces[index]
+            c = piece_class(piece)
+            from_cell = piece.coord_y * self.width + piece.coord_x
+            to_cell = new_y * self.width + new_x
+
+        goal = self.goal_masks[c]
+        return state.h + (goal >> from_cell & 1) - (goal >> to_cell & 1)
+
+
+heuristics = {'manhattan': ManhattanHeuristic,
+              'nearest': NearestHeuristic,
+              'assignment': AssignmentHeuristic,
+              'pdb': PatternDatabaseHeuristic,
+              'misplaced': MisplacedHeuristic}
+
+
+def a_star_generate_successors(current_state:State, goal_state:State):
+    successor_states = []
+    current_board = current_state.board
+    g = current_state.depth + 1
+
+    hfn = current_state.hfn
+    if hfn is None:
+        hfn = ManhattanHeuristic(goal_state.board)
+
+    if isinstance(current_board, PackedBoard):
+        layout = current_board.layout
+        for move in packed_moves(current_board):
+            new_board = PackedBoard(layout, move[3])
+            h = hfn.child_value(current_state, move, new_board)
+            successor_states.append(State(new_board, hfn, h + g, g, current_state, h))
+        return successor_states
+
+    for move in grid_moves(current_board):
+        index, new_x, new_y = move
+        new_board = current_board.move_piece(index, new_x, new_y)
+        h = hfn.child_value(current_state, move, new_board)
+        successor_states.append(State(new_board, hfn, h + g, g, current_state, h))
+
+    return successor_states
+
+
+class SearchNode:
+    """
+    Frontier entry of AStarsearch. Unlike State it points to its parent by key, so
+    nothing keeps a board alive once its node has been expanded.
+    """
+
+    __slots__ = ('f', 'h', 'depth', 'board', 'parent')
+
+    def __init__(self, f, h, depth, board, parent):
+        """
+        :param board: The board of the node.
+        :type board: Board
+        :param parent: The key() of the board of the parent node, None for the root.
+        :type parent: Optional[Union[str, int]]
+        """
+        self.f = f
+        self.h = h
+        self.depth = depth
+        self.board = board
+        self.parent = parent
+
+
+class OpenList:
+    """
+    Frontier of AStarsearch. It keeps the best g pushed for every state, so a
+    duplicate that is no better is dropped when pushed, and an entry beaten by a
+    later better one (a lazy decrease-key) is skipped when popped.
+    Ties on f go to the higher g, or to the lower h, then to the oldest entry.
+    """
+
+    def __init__(self, tie_break='g'):
+        """
+        :param tie_break: 'g' to prefer the higher g on equal f, 'h' the lower h.
+        :type tie_break: str
+        """
+        self.tie_break = tie_break
+        self.heap = []
+        self.best_g = {}
+        self.count = 0
+
+        # Instrumentation.
+        self.pushed = 0
+        self.dropped = 0
+        self.superseded = 0
+        self.skipped = 0
+        self.max_size = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, node:SearchNode, key):
+        """
+        Adds the node unless the state, identified by key, was already pushed with
+        a g at most as good.
+        """
+        g = self.best_g.get(key)
+        if g is not None:
+            if g <= node.depth:
+                self.dropped += 1
+                return
+            self.superseded += 1
+        self.best_g[key] = node.depth
+
+        tie = -node.depth if self.tie_break == 'g' else node.h
+        heapq.heappush(self.heap, (node.f, tie, self.count, key, node))
+        self.count += 1
+        self.pushed += 1
+        if len(self.heap) > self.max_size:
+            self.max_size = len(self.heap)
+
+    def peek(self):
+        """
+        Returns the best node without removing it, or None if the list is empty.
+        """
+        while self.heap:
+            f, tie, count, key, node = self.heap[0]
+            if self.best_g[key] == node.depth:
+                return node
+            heapq.heappop(self.heap)
+            self.skipped += 1
+        return None
+
+    def pop(self):
+        """
+        Removes and returns (key, node) of the best node, or None if the list is empty.
+        """
+        while self.heap:
+            f, tie, count, key, node = heapq.heappop(self.heap)
+            if self.best_g[key] == node.depth:
+                return key, node
+            self.skipped += 1
+        return None
+
+    def report(self):
+        """
+        Returns a line with the heap size and the duplicate rate.
+        """
+        offered = self.pushed + self.dropped
+        rate = 100.0 * self.dropped / offered if offered else 0.0
+        return 'open list: {} pushed, {} duplicates dropped ({:.1f}%), {} superseded, ' \
+               '{} stale entries skipped, peak heap {}, final heap {}'.format(
+                   self.pushed, self.dropped, rate, self.superseded, self.skipped, self.max_size, len(self.heap))
+
+
+def rebuild_path(closed, node:SearchNode, decode, fold_mirror):
+    """
+    Follows the parent keys stored in closed from the node back to the root and
+    returns the node as a State whose parents are the path, for generate_output.
+
+    :param closed: Maps the explored key of every expanded board to the key() of its parent.
+    :type closed: Dict
+    :param decode: Turns a key() back into a board, see key_decoder.
+    :type decode: Callable
+    """
+    boards = [node.board]
+    parent = node.parent
+
+    while parent is not None:
+        board = decode(parent)
+        boards.append(board)
+        parent = closed[board.key(fold_mirror)]
+
+    state = None
+    for depth, board in enumerate(reversed(boards)):
+        state = State(board, None, depth, depth, state)
+    return state
+
+
+def AStarsearch(initial_state, goal_state, budget=None, frontier=None, weight=1):
+    """
+    :param budget: The limits of the search, None for no limit.
+    :type budget: Optional[SearchBudget]
+    :param frontier: The open list to use, a new OpenList if None. Pass one to
+        choose its tie breaking or to read its counters after the search.
+    :type frontier: Optional[OpenList]
+    :param weight: Weighted A* orders the nodes by g + weight * h. With an
+        admissible heuristic the solution is at most weight times the optimal.
+    :type weight: float
+    """
+    if initial_state.hfn is None:
+        initial_state.hfn = ManhattanHeuristic(goal_state.board)
+    initial_state.h = initial_state.hfn.value(initial_state.board)
+    initial_state.f = initial_state.depth + weight * initial_state.h
+    hfn = initial_state.hfn
+
+    if frontier is None:
+        frontier = OpenList()
+
+    # explored maps the key of every expanded board to the key() of its parent,
+    # the path is only rebuilt from it once the goal is found.
+    explored = {}
+    fold_mirror = goal_allows_mirror(goal_state.board)
+    decode = key_decoder(initial_state.board)
+
+    frontier.push(SearchNode(initial_state.f, initial_state.h, initial_state.depth, initial_state.board, None),
+                  initial_state.board.key(fold_mirror))
+
+    while frontier:
+        entry = frontier.pop()
+        if entry is None:
+            break
+        str_board, node = entry
         
-        str_board = curr_state.board.to_string()
+        if is_goal_state(node.board, goal_state.board):
+            return rebuild_path(explored, node, decode, fold_mirror)
         
         if str_board not in explored:
-            explored.add(str_board)
+            if budget is not None:
+                budget.expand()
+            explored[str_board] = node.parent
+            curr_state = State(node.board, hfn, node.f, node.depth, None, node.h)
+            parent_key = node.board.key()
+            pushed = frontier.pushed
+            successors = a_star_generate_successors(curr_state, goal_state)
         
+            for successor in successors:
+                key = successor.board.key(fold_mirror)
+                if key not in explored:
+                    if weight != 1:
+                        successor.f = successor.depth + weight * successor.h
+                    frontier.push(SearchNode(successor.f, successor.h, successor.depth, successor.board, parent_key), key)
+
+            if budget is not None:
+                budget.record(len(successors), len(successors) - (frontier.pushed - pushed), len(frontier))
+
+    return None
+
+
+def ARAStarsearch(initial_state, goal_state, weight=3.0, step=0.5, budget=None, report=None):
+    """
+    Anytime repairing A*: weighted A* searches with smaller and smaller weights,
+    down to 1. Every search keeps the g values of the previous ones and only
+    expands again the states whose g improved, so the first solution comes as
+    fast as with weighted A* and the following ones cost little.
+
+    Once a solution is known, running out of budget ends the search with the
+    best solution found instead of raising SearchBudgetExceeded.
+
+    :param weight: The weight of the first search.
+    :type weight: float
+    :param step: How much the weight decreases between searches.
+    :type step: float
+    :param report: Called as report(state, bound) after every search, bound being
+        how many times the optimal length the solution may be at most. The bound
+        only holds for admissible heuristics.
+    :type report: Optional[Callable]
+    :return: The best solution found, or None if there is none.
+    :rtype: Optional[State]
+    """
+    if initial_state.hfn is None:
+        initial_state.hfn = ManhattanHeuristic(goal_state.board)
+    hfn = initial_state.hfn
+
+    fold_mirror = goal_allows_mirror(goal_state.board)
+    decode = key_decoder(initial_state.board)
+    goal_key = goal_state.board.key(fold_mirror)
+
+    # g, h and parents (the key() of the parent) are kept for every reached state.
+    # opened holds the boards to expand, incons the boards whose g improved after
+    # they were expanded, they are expanded again by the next search.
+    # expanded maps the exact key() of every board expanded to the key() of its
+    # parent when it was expanded, the path is rebuilt from it: a state whose g
+    # improves through its mirror image gets a parent that is not a parent of
+    # the board its earlier children came from.
+    start_key = initial_state.board.key(fold_mirror)
+    g = {start_key: initial_state.depth}
+    h = {start_key: hfn.value(initial_state.board)}
+    parents = {start_key: None}
+    opened = {start_key: initial_state.board}
+    incons = {}
+    expanded = {}
+    best = None
+
+    while True:
+        closed = set()
+        frontier = [(g[key] + weight * h[key], -g[key], count, key) for count, key in enumerate(opened)]
+        heapq.heapify(frontier)
+        count = len(frontier)
+
+        try:
+            while frontier:
+                f, neg_g, _, key = frontier[0]
+                if key not in opened or g[key] != -neg_g:
+                    heapq.heappop(frontier)
+                    continue
+                if goal_key in g and f >= g[goal_key]:
+                    break
+
+                heapq.heappop(frontier)
+                if budget is not None:
+                    budget.expand()
+                board = opened.pop(key)
+                closed.add(key)
+                curr_state = State(board, hfn, f, g[key], None, h[key])
+                parent_key = board.key()
+                expanded[parent_key] = parents[key]
+                successors = a_star_generate_successors(curr_state, goal_state)
+                duplicates = 0
+
+                for successor in successors:
+                    child = successor.board.key(fold_mirror)
+                    if child in g and g[child] <= successor.depth:
+                        duplicates += 1
+                        continue
+                    g[child] = successor.depth
+                    h[child] = successor.h
+                    parents[child] = parent_key
+
+                    if child in closed:
+                        incons[child] = successor.board
+                    else:
+                        opened[child] = successor.board
+                        heapq.heappush(frontier, (successor.depth + weight * successor.h, -successor.depth, count, child))
+                        count += 1
+
+                if budget is not None:
+                    budget.record(len(successors), duplicates, len(opened))
+        except SearchBudgetExceeded:
+            if best is None:
+                raise
+            return best
+
+        if goal_key not in g:
+            return None
+
+        length = g[goal_key]
+        if best is None or length < best.depth:
+            goal_board = opened[goal_key]
+            best = rebuild_path(expanded, SearchNode(length, 0, length, goal_board, parents[goal_key]), decode, False)
+
+        # The optimal length is at least the smallest g + h of the states left to expand.
+        lower = min(g[key] + h[key] for key in itertools.chain(opened, incons))
+        bound = max(1.0, min(weight, best.depth / lower)) if lower > 0 else 1.0
+        if report is not None:
+            report(best, bound)
+
+        if bound <= 1:
+            return best
+        weight = max(1.0, weight - step)
+        opened.update(incons)
+        incons = {}
+
+
+def hda_owner(key, workers):
+    """
+    Returns the HDA* worker owning the state with the given key(). The hash must
+    be the same in every process, so str keys use crc32 rather than the salted
+    str hash (the hash of a tuple of ints is not salted).
+    """
+    if isinstance(key, int):
+        return hash((key,)) % workers
+    return zlib.crc32(key.encode()) % workers
+
+
+def hda_worker(index, workers, initial_state, goal_state, inboxes, outbox, chunk):
+    """
+    The process of one HDA* worker. It owns the states whose hda_owner is index,
+    with their open list and parents. Its inbox, inboxes[index], gets:
+
+    ('nodes', nodes): nodes sent by the other workers (or the start node), as
+    (key, board key, g, h, parent key), which are pushed to the open list.
+
+    ('incumbent', length): the length of the best solution found so far.
+
+    ('probe', wave): answered on outbox with ('probe', wave, index, idle, sent,
+    received), idle being True if the worker has no node with f below the
+    incumbent, and sent and received the number of node messages so far.
+
+    ('parent', board key): answered on outbox with ('parent', key() of the
+    parent of an expanded board). Parents are kept by the exact key() of the
+    board expanded rather than by its folded key: a state expanded again
+    through its mirror image gets another parent, which is not a parent of the
+    board the earlier children came from.
+
+    None: stops.
+
+    Between messages the worker expands up to chunk of its best nodes, sends the
+    successors owned by other workers straight to their inboxes, and puts
+    ('stats', index, expanded, generated, duplicates, frontier size, idle) on
+    outbox, and ('goal', length, board key, parent key) for a solution found.
+    """
+    hfn = initial_state.hfn
+    goal_board = goal_state.board
+    fold_mirror = goal_allows_mirror(goal_board)
+    decode = key_decoder(initial_state.board)
+    inbox = inboxes[index]
+    frontier = OpenList()
+    parents = {}
+    incumbent = float('inf')
+    sent = received = 0
+    idle = True
+
+    while True:
+        node = frontier.peek()
+        messages = []
+        if node is None or node.f >= incumbent:
+            messages.append(inbox.get())
+        try:
+            while True:
+                messages.append(inbox.get_nowait())
+        except queue.Empty:
+            pass
+
+        dropped = frontier.dropped
+        for message in messages:
+            if message is None:
+                # Nodes still buffered for workers that stopped first are dropped instead of blocking the exit.
+                for other in inboxes:
+                    other.cancel_join_thread()
+                return
+            kind = message[0]
+            if kind == 'nodes':
+                received += 1
+                for key, board_key, g, h, parent in message[1]:
+                    if frontier.best_g.get(key, g + 1) <= g:
+                        frontier.dropped += 1
+                        continue
+                    frontier.push(SearchNode(g + h, h, g, decode(board_key), parent), key)
+            elif kind == 'incumbent':
+                incumbent = min(incumbent, message[1])
+            elif kind == 'probe':
+                node = frontier.peek()
+                outbox.put(('probe', message[1], index, node is None or node.f >= incumbent, sent, received))
+            elif kind == 'parent':
+                outbox.put(('parent', parents[message[1]]))
+
+        expanded = generated = 0
+        sends = [[] for _ in range(workers)]
+
+        while expanded < chunk:
+            node = frontier.peek()
+            if node is None or node.f >= incumbent:
+                break
+            key, node = frontier.pop()
+
+            if is_goal_state(node.board, goal_board):
+                incumbent = node.depth
+                outbox.put(('goal', node.depth, node.board.key(), node.parent))
+                continue
+
+            expanded += 1
+            parent_key = node.board.key()
+            parents[parent_key] = node.parent
+            curr_state = State(node.board, hfn, node.f, node.depth, None, node.h)
+
             for successor in a_star_generate_successors(curr_state, goal_state):
-                heapq.heappush(frontier, successor)
-                #print(successor.f)
+                generated += 1
+                if successor.f >= incumbent:
+                    continue
+                key = successor.board.key(fold_mirror)
+                owner = hda_owner(key, workers)
+                if owner == index:
+                    frontier.push(SearchNode(successor.f, successor.h, successor.depth, successor.board, parent_key), key)
+                else:
+                    sends[owner].append((key, successor.board.key(), successor.depth, successor.h, parent_key))
+
+        for owner, nodes in enumerate(sends):
+            if nodes:
+                inboxes[owner].put(('nodes', nodes))
+                sent += 1
+
+        # HDAStarsearch only probes for the end of the search once every worker reported being idle.
+        node = frontier.peek()
+        was_idle, idle = idle, node is None or node.f >= incumbent
+        if expanded or generated or frontier.dropped > dropped or idle != was_idle:
+            outbox.put(('stats', index, expanded, generated, frontier.dropped - dropped, len(frontier), idle))
+
+
+def HDAStarsearch(initial_state, goal_state, workers=None, budget=None, chunk=256):
+    """
+    Hash distributed A*: every state belongs to one of workers processes, chosen
+    by hashing its key(), which keeps its open list and parents. A worker pushes
+    the successors it owns and puts the others straight in the inbox of their
+    owner, so the nodes never go through this process, which only keeps the
+    best solution, the statistics and detects the end of the search.
+
+    As the workers do not expand the nodes in the global order of f, a state can
+    be expanded again when reached with a better g. The search stops once no
+    worker nor message holds a node with f below the best solution found, which
+    is then optimal with an admissible heuristic. Messages in flight are found
+    by counting: once every worker reports being idle, all are probed for their
+    idle state and the node messages they sent and received, and the search
+    ends when two probes in a row find every worker idle, as many messages
+    received as sent, and the same counts.
+
+    :param workers: The number of worker processes, the number of CPUs if None.
+    :type workers: Optional[int]
+    :param budget: The limits of the search, None for no limit.
+    :type budget: Optional[SearchBudget]
+    :param chunk: The number of nodes a worker expands between reading its inbox.
+    :type chunk: int
+    """
+    if initial_state.hfn is None:
+        initial_state.hfn = ManhattanHeuristic(goal_state.board)
+    initial_state.h = initial_state.hfn.value(initial_state.board)
+    initial_state.f = initial_state.depth + initial_state.h
+
+    workers = workers or os.cpu_count() or 1
+    fold_mirror = goal_allows_mirror(goal_state.board)
+    decode = key_decoder(initial_state.board)
+
+    # Forked workers inherit the heuristic, a pattern database included, instead of pickling it.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    inboxes = [context.Queue() for _ in range(workers)]
+    outbox = context.Queue()
+    processes = [context.Process(target=hda_worker, daemon=True,
+                                 args=(i, workers, initial_state, goal_state, inboxes, outbox, chunk))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        key = initial_state.board.key(fold_mirror)
+        inboxes[hda_owner(key, workers)].put(
+            ('nodes', [(key, initial_state.board.key(), initial_state.depth, initial_state.h, None)]))
+        started = 1
+        incumbent = float('inf')
+        best = None
+
+        idle = [True] * workers
+        sizes = [0] * workers
+        wave = 0
+        replies = None
+        last_counts = None
+
+        while True:
+            if replies is None and all(idle):
+                wave += 1
+                replies = {}
+                for inbox in inboxes:
+                    inbox.put(('probe', wave))
+
+            message = outbox.get()
+            kind = message[0]
+
+            if kind == 'goal':
+                length, board_key, parent = message[1:]
+                if length < incumbent:
+                    incumbent, best = length, (length, board_key, parent)
+                    for inbox in inboxes:
+                        inbox.put(('incumbent', length))
+
+            elif kind == 'stats':
+                index, expanded, generated, duplicates, size, idle[index] = message[1:]
+                sizes[index] = size
+                if budget is not None:
+                    budget.record(generated, duplicates, sum(sizes))
+                    for _ in range(expanded):
+                        budget.expand()
+
+            elif kind == 'probe' and message[1] == wave:
+                index, idle[index], sent, received = message[2:]
+                replies[index] = (idle[index], sent, received)
+                if len(replies) == workers:
+                    counts = [replies[i] for i in range(workers)]
+                    if all(i for i, s, r in counts) and \
+                            started + sum(s for i, s, r in counts) == sum(r for i, s, r in counts):
+                        if counts == last_counts:
+                            break
+                        last_counts = counts
+                    else:
+                        last_counts = None
+                    replies = None
+
+        if best is None:
+            return None
+
+        length, board_key, parent = best
+        boards = [decode(board_key)]
+        while parent is not None:
+            boards.append(decode(parent))
+            inboxes[hda_owner(boards[-1].key(fold_mirror), workers)].put(('parent', parent))
+            message = outbox.get()
+            while message[0] != 'parent':
+                message = outbox.get()
+            parent = message[1]
+
+        boards.reverse()
+        return path_state(boards)
+
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+
+def ida_star_iteration(initial_state, goal_state, bound, fold_mirror, table_size, budget=None):
+    """
+    One depth first pass of IDA* that only follows states with f <= bound.
+    Returns the goal state if found, and the smallest f above the bound.
+    Only the current path and the children left at each level are in memory,
+    plus up to table_size entries of the transposition table.
+    """
+    next_bound = float('inf')
+
+    # The transposition table maps a key to the smallest depth it was reached at in
+    # this pass. When full, the oldest entry is evicted (dicts keep insertion order).
+    table = {}
+    keys = [initial_state.board.key(fold_mirror)]
+    path = set(keys)
+    children = [iter(sorted(a_star_generate_successors(initial_state, goal_state), key=lambda s: s.f))]
+
+    while children:
+        child = next(children[-1], None)
+
+        if child is None:
+            children.pop()
+            path.discard(keys.pop())
+            continue
+
+        if child.f > bound:
+            next_bound = min(next_bound, child.f)
+            continue
+
+        if is_goal_state(child.board, goal_state.board):
+            return child, next_bound
+
+        key = child.board.key(fold_mirror)
+        if key in path:
+            if budget is not None:
+                budget.record(0, 1, len(children))
+            continue
+
+        if table_size:
+            depth = table.get(key)
+            if depth is not None and depth <= child.depth:
+                if budget is not None:
+                    budget.record(0, 1, len(children))
+                continue
+            if depth is None and len(table) >= table_size:
+                del table[next(iter(table))]
+            table[key] = child.depth
+
+        if budget is not None:
+            budget.expand()
+        keys.append(key)
+        path.add(key)
+        successors = sorted(a_star_generate_successors(child, goal_state), key=lambda s: s.f)
+        children.append(iter(successors))
+        if budget is not None:
+            budget.record(len(successors), 0, len(children))
+
+    return None, next_bound
+
+
+def IDAStarsearch(initial_state, goal_state, table_size=0, budget=None):
+    """
+    Iterative deepening A*: repeated depth first passes with a growing bound on f.
+    Memory is linear in the depth of the solution, unlike AStarsearch.
+
+    :param table_size: The number of entries of the transposition table, 0 to disable it.
+    :type table_size: int
+    """
+    if initial_state.hfn is None:
+        initial_state.hfn = ManhattanHeuristic(goal_state.board)
+    initial_state.h = initial_state.hfn.value(initial_state.board)
+    initial_state.f = initial_state.depth + initial_state.h
+
+    if is_goal_state(initial_state.board, goal_state.board):
+        return initial_state
+
+    fold_mirror = goal_allows_mirror(goal_state.board)
+    bound = initial_state.f
+
+    while bound != float('inf'):
+        result, bound = ida_star_iteration(initial_state, goal_state, bound, fold_mirror, table_size, budget)
+        if result is not None:
+            return result
 
     return None
 
 
+"""
+/////Bidirectional Search/////
+"""
+def expand_layer(frontier, reached, other_reached, budget=None):
+    """
+    Expands one whole breadth first layer of one side of the bidirectional search.
+    Returns the next layer, and the best (forward length + backward length, state,
+    other state) meeting point with the other side, if any.
+    """
+    next_frontier = []
+    meeting = None
+
+    for state in frontier:
+        if budget is not None:
+            budget.expand()
+        successors = board_successors(state.board)
+        duplicates = 0
+
+        for new_board in successors:
+            key = new_board.key()
+            if key in reached:
+                duplicates += 1
+                continue
+
+            new_state = State(new_board, None, state.depth + 1, state.depth + 1, state)
+            reached[key] = new_state
+            next_frontier.append(new_state)
+
+            other = other_reached.get(key)
+            if other is not None and (meeting is None or new_state.depth + other.depth < meeting[0]):
+                meeting = (new_state.depth + other.depth, new_state, other)
+
+        if budget is not None:
+            budget.record(len(successors), duplicates, len(frontier) + len(next_frontier))
+
+    return next_frontier, meeting
+
+
+def join_paths(forward_state, backward_state):
+    """
+    Returns the goal state of the path made of the forward path to forward_state
+    followed by the backward path from backward_state, which is on the same board.
+    Parents of backward states point towards the goal, so they are re-linked.
+    """
+    state = forward_state
+    backward_state = backward_state.parent
+
+    while backward_state is not None:
+        depth = state.depth + 1
+        state = State(backward_state.board, None, depth, depth, state)
+        backward_state = backward_state.parent
+
+    return state
+
+
+def BidirectionalSearch(initial_state, goal_state, budget=None):
+    """
+    Breadth first search from the initial board and from the goal board at once,
+    expanding whole layers of the smaller side until the two sides meet.
+    Moves are reversible, so the backward side uses the same successors.
+    Every layer is finished before stopping, which keeps the path the shortest.
+    """
+    if is_goal_state(initial_state.board, goal_state.board):
+        return initial_state
+
+    start = State(initial_state.board, None, 0, 0, None)
+    goal = State(goal_state.board, None, 0, 0, None)
+    forward = {start.board.key(): start}
+    backward = {goal.board.key(): goal}
+    forward_frontier = [start]
+    backward_frontier = [goal]
+
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, meeting = expand_layer(forward_frontier, forward, backward, budget)
+            if meeting is not None:
+                return join_paths(meeting[1], meeting[2])
+        else:
+            backward_frontier, meeting = expand_layer(backward_frontier, backward, forward, budget)
+            if meeting is not None:
+                return join_paths(meeting[2], meeting[1])
+
+    return None
+
+
+"""
+/////State Space Table/////
+"""
+space_magic = b'HRDSPC1\n'
+space_max_states = 1 << 22
+
+def next_prime(n):
+    """
+    Returns the smallest prime at least n.
+    """
+    n = max(n, 2)
+    while any(n % d == 0 for d in range(2, int(n ** 0.5) + 1)):
+        n += 1
+    return n
+
+
+class StateSpaceTable:
+    """
+    The distance to the goal of every board that can reach it, found by one
+    breadth first search from the goal. Moves are reversible, so that search
+    enumerates the whole connected state space of the goal, and the distance
+    of any start in it is then a constant time lookup.
+
+    Boards are stored packed (mirror folded when the goal allows it) in an open
+    addressing hash table of fixed size records, a packed board followed by its
+    distance, which is kept in a file and mapped into memory like PatternDatabase.
+    """
+
+    def __init__(self, goal_board:PackedBoard, path, budget=None):
+        """
+        :param goal_board: The goal board.
+        :type goal_board: PackedBoard
+        :param path: The file the table is loaded from, or built into if missing.
+        :type path: str
+        :param budget: The limits of the search the table is built for, which
+            the boards expanded by the build count against.
+        :type budget: Optional[SearchBudget]
+        """
+        layout = goal_board.layout
+        self.layout = layout
+        self.goal_bits = goal_board.bits
+        self.fold_mirror = goal_allows_mirror(goal_board)
+        self.key_size = layout.byte_size(goal_board.bits)
+        self.record_size = self.key_size + 2
+        self.empty = bytes(self.key_size)
+        self.header = self.build_header()
+
+        if not os.path.exists(path):
+            self.save(path, *self.build(budget))
+        self.load(path)
+
+    def explore(self, budget=None):
+        """
+        Breadth first search from the goal. Returns the distance of every board
+        that can reach the goal, by key.
+        """
+        goal = PackedBoard(self.layout, self.goal_bits)
+        distances = {goal.key(self.fold_mirror): 0}
+        frontier = [goal]
+        distance = 0
+
+        while frontier:
+            distance += 1
+            if distance > 0xffff:
+                raise ValueError('the state space is too deep for a state space table')
+            next_frontier = []
+            for board in frontier:
+                if budget is not None:
+                    budget.expand()
+                for child in packed_successors(board):
+                    key = child.key(self.fold_mirror)
+                    if key not in distances:
+                        distances[key] = distance
+                        next_frontier.append(child)
+            frontier = next_frontier
+
+            if len(distances) > space_max_states:
+                raise ValueError('the state space has more than {} boards, use a search instead'.format(space_max_states))
+
+        return distances
+
+    def position(self, data, offset, capacity, key):
+        """
+        Returns the position in data of the record of a key, or of the empty
+        record it would go in. The table is kept at most half full, so the
+        linear probing stops after a couple of records.
+        """
+        key_bytes = key.to_bytes(self.key_size, 'little')
+        record_size, key_size = self.record_size, self.key_size
+        slot = key % capacity
+
+        while True:
+            position = offset + slot * record_size
+            stored = data[position:position + key_size]
+            if stored == key_bytes or stored == self.empty:
+                return position
+            slot = slot + 1 if slot + 1 < capacity else 0
+
+    def build(self, budget=None):
+        """
+        Returns the capacity, the number of boards and the records of the table.
+        """
+        distances = self.explore(budget)
+        capacity = next_prime(2 * len(distances) + 1)
+        table = bytearray(capacity * self.record_size)
+
+        for key, distance in distances.items():
+            position = self.position(table, 0, capacity, key)
+            table[position:position + self.key_size] = key.to_bytes(self.key_size, 'little')
+            table[position + self.key_size:position + self.record_size] = distance.to_bytes(2, 'little')
+
+        return capacity, len(distances), table
+
+    def build_header(self):
+        layout = self.layout
+        goal = self.goal_bits.to_bytes(self.key_size, 'little')
+        return space_magic + struct.pack('<IIII', layout.width, layout.height, self.key_size, self.fold_mirror) + goal
+
+    def save(self, path, capacity, count, table):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Written next to the final file and renamed, so a reader never sees half a table.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(self.header)
+            f.write(struct.pack('<II', capacity, count))
+            f.write(table)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(self.header)] != self.header:
+            raise ValueError('{} is not a state space table for this goal board'.format(path))
+        self.capacity, self.count = struct.unpack_from('<II', self.mmap, len(self.header))
+        self.offset = len(self.header) + 8
+        if len(self.mmap) != self.offset + self.capacity * self.record_size:
+            raise ValueError('{} is truncated'.format(path))
+
+    def distance(self, board:PackedBoard):
+        """
+        Returns the number of moves from a packed board to the goal, or None if
+        the goal cannot be reached from it.
+        """
+        position = self.position(self.mmap, self.offset, self.capacity, board.key(self.fold_mirror))
+        if self.mmap[position:position + self.key_size] == self.empty:
+            return None
+        return int.from_bytes(self.mmap[position + self.key_size:position + self.record_size], 'little')
+
+    def path(self, board:PackedBoard):
+        """
+        Returns the boards of a shortest path from a packed board to the goal, or
+        None if there is none. Every step follows a child one move closer.
+        """
+        distance = self.distance(board)
+        if distance is None:
+            return None
+
+        boards = [board]
+        while distance > 0:
+            for child in packed_successors(board):
+                if self.distance(child) == distance - 1:
+                    board = child
+                    break
+            boards.append(board)
+            distance -= 1
+
+        return boards
+
+
+def space_path(goal_board:PackedBoard, directory):
+    """
+    Returns the file of the state space table of a goal board.
+    """
+    layout = goal_board.layout
+    metric = '' if move_metric == 'step' else '_' + move_metric
+    return os.path.join(directory, 'space_{}x{}_{:x}{}{}.bin'.format(
+        layout.width, layout.height, goal_board.bits,
+        classes_signature(goal_board.bits, layout.size), metric))
+
+
+"""
+/////Solution Cache/////
+"""
+def path_boards(state:State):
+    """
+    Returns the boards from the initial state to the given state.
+    """
+    boards = []
+    while state is not None:
+        boards.append(state.board)
+        state = state.parent
+    return boards[::-1]
+
+
+def is_valid_path(boards, board, goal_board):
+    """
+    Returns True if the boards go from board to goal_board one legal move at a
+    time, moves being counted with the current move metric.
+    """
+    boards = [b.to_board() if isinstance(b, PackedBoard) else b for b in boards]
+    if not boards or boards[0].key() != board.key() or not is_goal_state(boards[-1], goal_board):
+        return False
+    for current, following in zip(boards, boards[1:]):
+        if following.key() not in [child.key() for child in board_successors(current)]:
+            return False
+    return True
+
+
+def path_state(boards):
+    """
+    Returns the last state of a chain of states over the given boards.
+    """
+    state = None
+    for depth, board in enumerate(boards):
+        state = State(board, None, depth, depth, state)
+    return state
+
+
+class SolutionCache:
+    """
+    Solutions kept in an SQLite file across runs.
+
+    Boards are stored packed, so pieces of the same shape are interchangeable,
+    and a puzzle and its mirror image share their entry: the goal of an entry is
+    the smaller of the packed goal and its mirror, and the whole path is mirrored
+    along with it. Every board of a stored path is indexed, so a puzzle whose
+    start lies on a cached path to the same goal is answered by the rest of that path.
+    Once there are more than max_entries solutions the least recently used go.
+    """
+
+    def __init__(self, path, max_entries=10000, method=''):
+        """
+        :param path: The SQLite file.
+        :type path: str
+        :param max_entries: The number of solutions kept.
+        :type max_entries: int
+        :param method: Names the search the solutions come from. Only solutions of the
+            same method are returned, so a cached dfs path never answers an A* query.
+        :type method: str
+        """
+        self.max_entries = max_entries
+        self.method = method
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS solutions (id INTEGER PRIMARY KEY, method TEXT, '
+                'goal TEXT, start TEXT, length INTEGER, path BLOB, last_used REAL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS path_boards (method TEXT, goal TEXT, board TEXT, '
+                'solution INTEGER, position INTEGER)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS path_boards_board ON path_boards (method, goal, board)')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def canonical_goal(self, goal_board:PackedBoard):
+        """
+        Returns the key of the entry of a goal, and True if it is the mirror of the goal.
+        """
+        layout = goal_board.layout
+        mirrored = layout.mirror(goal_board.bits)
+        goal_bits = min(goal_board.bits, mirrored)
+        goal = '{}x{}{}:{:x}'.format(layout.width, layout.height, classes_signature(goal_bits, layout.size), goal_bits)
+        return goal, goal_bits != goal_board.bits
+
+    def lookup(self, board:Board, goal_board:Board):
+        """
+        Returns the boards of a cached path from board to goal_board, or None.
+        """
+        board = board if isinstance(board, PackedBoard) else pack_board(board)
+        goal_board = goal_board if isinstance(goal_board, PackedBoard) else pack_board(goal_board)
+        layout = board.layout
+        goal, flip = self.canonical_goal(goal_board)
+
+        # (board in the entry, whether the path found must be mirrored back)
+        candidates = [(layout.mirror(board.bits) if flip else board.bits, flip)]
+        if goal_board.bits == layout.mirror(goal_board.bits):
+            # Mirrored paths reach a symmetric goal too.
+            candidates.append((layout.mirror(board.bits), True))
+
+        best = None
+        for bits, mirrored in candidates:
+            row = self.connection.execute(
+                'SELECT s.id, s.path, s.length - p.position AS remaining, p.position '
+                'FROM path_boards p JOIN solutions s ON s.id = p.solution '
+                'WHERE p.method = ? AND p.goal = ? AND p.board = ? ORDER BY remaining LIMIT 1',
+                (self.method, goal, '{:x}'.format(bits))).fetchone()
+            if row is not None and (best is None or row[2] < best[0][2]):
+                best = (row, mirrored)
+
+        if best is None:
+            return None
+
+        (solution, blob, remaining, position), mirrored = best
+        with self.connection:
+            self.connection.execute('UPDATE solutions SET last_used = ? WHERE id = ?', (time.time(), solution))
+
+        width = layout.byte_size(goal_board.bits)
+        boards = []
+        for i in range(position, len(blob) // width):
+            bits = int.from_bytes(blob[i * width:(i + 1) * width], 'little')
+            boards.append(PackedBoard(layout, layout.mirror(bits) if mirrored else bits))
+        return boards
+
+    def store(self, boards):
+        """
+        Stores the path made of the given boards, from the start to the goal.
+        """
+        packed = [b if isinstance(b, PackedBoard) else pack_board(b) for b in boards]
+        layout = packed[0].layout
+        goal, flip = self.canonical_goal(packed[-1])
+        bits = [layout.mirror(b.bits) if flip else b.bits for b in packed]
+
+        start = '{:x}'.format(bits[0])
+        width = layout.byte_size(packed[-1].bits)
+        blob = b''.join([b.to_bytes(width, 'little') for b in bits])
+
+        with self.connection:
+            row = self.connection.execute(
+                'SELECT id, length FROM solutions WHERE method = ? AND goal = ? AND start = ?',
+                (self.method, goal, start)).fetchone()
+            if row is not None:
+                if row[1] <= len(bits) - 1:
+                    return
+                self.delete([row[0]])
+
+            solution = self.connection.execute(
+                'INSERT INTO solutions (method, goal, start, length, path, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                (self.method, goal, start, len(bits) - 1, blob, time.time())).lastrowid
+            self.connection.executemany(
+                'INSERT INTO path_boards (method, goal, board, solution, position) VALUES (?, ?, ?, ?, ?)',
+                [(self.method, goal, '{:x}'.format(b), solution, position) for position, b in enumerate(bits)])
+
+            count = self.connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+            if count > self.max_entries:
+                evicted = self.connection.execute(
+                    'SELECT id FROM solutions ORDER BY last_used LIMIT ?', (count - self.max_entries,)).fetchall()
+                self.delete([row[0] for row in evicted])
+
+    def delete(self, solutions):
+        self.connection.executemany('DELETE FROM solutions WHERE id = ?', [(s,) for s in solutions])
+        self.connection.executemany('DELETE FROM path_boards WHERE solution = ?', [(s,) for s in solutions])
+
+
+def cache_method(options):
+    """
+    Returns the name of the search chosen by the command line options, for SolutionCache.
+    """
+    if options.algo in ['astar', 'idastar', 'arastar', 'hdastar']:
+        method = '{}/{}'.format(options.algo, options.heuristic)
+    elif options.algo == 'wastar':
+        method = 'wastar/{}/{}'.format(options.heuristic, options.weight)
+    else:
+        method = options.algo
+    if options.move_metric != 'step':
+        method += '/' + options.move_metric
+    return method
+
+
+"""
+/////Solving Puzzles/////
+"""
+def run_search(board, goal_board, options, budget=None, outputfile=None):
+    """
+    Runs the search chosen by the command line options from board to goal_board.
+
+    :param options: The parsed command line arguments.
+    :type options: argparse.Namespace
+    :param budget: The limits of the search, the one of make_budget if None.
+    :type budget: Optional[SearchBudget]
+    :param outputfile: Where arastar writes every better solution as it finds them.
+    :type outputfile: Optional[str]
+    :return: The goal state, or None if there is no solution, and the statistics
+        of the search, None unless the command line options ask for them.
+    :rtype: Tuple[Optional[State], Optional[SearchStats]]
+    """
+    if budget is None:
+        budget = make_budget(options)
+    set_move_metric(options.move_metric)
+
+    if options.engine == 'bitboard':
+        board, goal_board = pack_board(board), pack_board(goal_board)
+
+    newState = State(board, None, 0, 0, None)
+    goalState = State(goal_board, None, 0, 0, None)
+
+    with search_phase(budget, 'heuristic'):
+        if options.algo in ['astar', 'wastar', 'arastar', 'idastar', 'hdastar']:
+            if options.heuristic == 'pdb':
+                pattern = None
+                if options.pdb_pattern:
+                    pattern = parse_pdb_pattern(options.pdb_pattern)
+                newState.hfn = PatternDatabaseHeuristic(goal_board, pattern, options.pdb_dir, budget)
+            else:
+                newState.hfn = heuristics[options.heuristic](goal_board)
+
+    with search_phase(budget, 'search'):
+        if options.algo == 'astar':
+            frontier = OpenList(options.tie_break)
+            result_state = AStarsearch(newState, goalState, budget, frontier)
+            if options.open_stats:
+                print(frontier.report(), file=sys.stderr)
+
+        elif options.algo == 'wastar':
+            frontier = OpenList(options.tie_break)
+            result_state = AStarsearch(newState, goalState, budget, frontier, options.weight)
+            if options.open_stats:
+                print(frontier.report(), file=sys.stderr)
+
+        elif options.algo == 'arastar':
+            def report(state, bound):
+                print('arastar: {} moves, at most {:.2f} times the optimal'.format(state.depth, bound), file=sys.stderr)
+                if outputfile:
+                    generate_output(state, outputfile, options.output_format, options.stream_output)
+
+            result_state = ARAStarsearch(newState, goalState, options.weight, options.weight_step, budget, report)
+
+        elif options.algo == 'idastar':
+            result_state = IDAStarsearch(newState, goalState, options.tt_size, budget)
+
+        elif options.algo == 'hdastar':
+            result_state = HDAStarsearch(newState, goalState, options.workers, budget)
+
+        elif options.algo == 'dfs':
+            result_state = DFSearch(newState, goalState, options.depth_limit, budget)
+
+        elif options.algo == 'iddfs':
+            result_state = IDDFSearch(newState, goalState, options.depth_limit, budget)
+
+        elif options.algo == 'bidirectional':
+            result_state = BidirectionalSearch(newState, goalState, budget)
+
+        elif options.algo == 'table':
+            packed_goal = goal_board if isinstance(goal_board, PackedBoard) else pack_board(goal_board)
+            table = StateSpaceTable(packed_goal, space_path(packed_goal, options.table_dir), budget)
+            boards = table.path(board if isinstance(board, PackedBoard) else pack_board(board))
+            if boards is not None and not isinstance(board, PackedBoard):
+                boards = [b.to_board() for b in boards]
+            result_state = None if boards is None else path_state(boards)
+
+    return result_state, search_stats(budget)
+
+
+def solve(board, goal_board, options, budget=None, outputfile=None):
+    """
+    Answers from the solution cache of the command line options if it has the
+    puzzle, and runs run_search and caches its solution otherwise.
+
+    :return: The goal state or None, the statistics of the search as returned
+        by run_search, and True if the solution came from the cache.
+    :rtype: Tuple[Optional[State], Optional[SearchStats], bool]
+    """
+    if budget is None:
+        budget = make_budget(options)
+    if not options.cache:
+        return run_search(board, goal_board, options, budget, outputfile) + (False,)
+
+    with SolutionCache(options.cache, options.cache_size, cache_method(options)) as cache:
+        with search_phase(budget, 'cache'):
+            boards = cache.lookup(board, goal_board)
+        if boards is not None:
+            return path_state(boards), search_stats(budget), True
+
+        result_state, stats = run_search(board, goal_board, options, budget, outputfile)
+        if result_state is not None:
+            with search_phase(budget, 'cache'):
+                cache.store(path_boards(result_state))
+        return result_state, stats, False
+
+
+def print_progress(stats:SearchStats):
+    """
+    The progress callback of --progress.
+    """
+    print('progress: ' + stats.report(), file=sys.stderr)
+
+
+def make_budget(options, always=False):
+    """
+    Returns the budget of the command line options: a SearchStats if statistics
+    or progress were asked for, a SearchBudget if the search is limited or always
+    is True, and None otherwise so that the searches skip all the bookkeeping.
+    """
+    if options.stats or options.progress:
+        progress = print_progress if options.progress else None
+        return SearchStats(options.max_nodes, options.timeout, progress, options.progress or 10000)
+    if always or options.max_nodes is not None or options.timeout is not None:
+        return SearchBudget(options.max_nodes, options.timeout)
+    return None
+
+
+def search_stats(budget):
+    """
+    Returns the budget if it keeps statistics, None otherwise.
+    """
+    return budget if isinstance(budget, SearchStats) else None
+
+
+def stats_dict(stats):
+    """
+    Returns the statistics of a search as a dict, or None if there are none.
+    """
+    return None if stats is None else stats.to_dict()
+
+
+def solve_puzzle(task):
+    """
+    Solves one puzzle file and writes its solution, used by the batch mode workers.
+
+    :param task: The input file, the output file and the command line options.
+    :type task: Tuple[str, str, argparse.Namespace]
+    :return: The summary of the puzzle: input file, status, seconds, nodes
+        expanded, solution length (None if not solved) and the statistics of
+        the search (None without --stats).
+    :rtype: Tuple[str, str, float, int, Optional[int], Optional[Dict]]
+
+    A puzzle that cannot be read or solved, e.g. a malformed file, gets the
+    status "error: " and the exception instead of stopping the whole batch.
+    """
+    inputfile, outputfile, options = task
+    start = time.perf_counter()
+    budget = make_budget(options, always=True)
+    stats = None
+
+    try:
+        with search_phase(budget, 'read'):
+            board, goal_board = read_from_file(inputfile)
+        result_state, stats, cached = solve(board, goal_board, options, budget, outputfile)
+
+        if result_state is None:
+            status = 'no solution'
+        elif options.verify and not is_valid_path(path_boards(result_state), board, goal_board):
+            status = 'invalid path'
+        else:
+            with search_phase(budget, 'output'):
+                generate_output(result_state, outputfile, options.output_format, options.stream_output)
+            status = 'cached' if cached else 'solved'
+            return inputfile, status, time.perf_counter() - start, budget.nodes, result_state.depth, stats_dict(stats)
+
+    except SearchBudgetExceeded as e:
+        status = str(e)
+        stats = search_stats(e.budget)
+    except Exception as e:
+        # One line in the tab separated summary.
+        status = ' '.join('error: {}: {}'.format(type(e).__name__, e).split())
+
+    return inputfile, status, time.perf_counter() - start, budget.nodes, None, stats_dict(stats)
+
+
+def batch_tasks(batch, outputdir, options):
+    """
+    Returns a solve_puzzle task for every puzzle of a batch, which is either a
+    directory of puzzle files or a manifest file listing one puzzle file per line.
+    Solutions are written to outputdir under the name of their puzzle file.
+    """
+    if os.path.isdir(batch):
+        inputfiles = [os.path.join(batch, name) for name in sorted(os.listdir(batch))
+                      if os.path.isfile(os.path.join(batch, name))]
+    else:
+        with open(batch) as manifest:
+            base = os.path.dirname(batch)
+            inputfiles = [os.path.join(base, line.strip()) for line in manifest if line.strip()]
+
+    os.makedirs(outputdir, exist_ok=True)
+    return [(inputfile, os.path.join(outputdir, os.path.basename(inputfile)), options)
+            for inputfile in inputfiles]
+
+
+def solve_batch(tasks, workers, summary):
+    """
+    Solves the tasks with a pool of worker processes and writes one summary line
+    per puzzle, in the order of the tasks, to the summary file. With --stats the
+    statistics of every search are added as a last column of json. As hdastar
+    runs its own worker processes, its puzzles are solved one after the other.
+    """
+    with_stats = bool(tasks) and bool(tasks[0][2].stats)
+    print('puzzle\tstatus\tseconds\tnodes\tlength' + ('\tstats' if with_stats else ''), file=summary)
+
+    with contextlib.ExitStack() as stack:
+        if tasks and tasks[0][2].algo == 'hdastar':
+            results = map(solve_puzzle, tasks)
+        else:
+            results = stack.enter_context(multiprocessing.Pool(workers)).imap(solve_puzzle, tasks)
+
+        for inputfile, status, seconds, nodes, length, stats in results:
+            line = '{}\t{}\t{:.3f}\t{}\t{}'.format(inputfile, status, seconds, nodes, '-' if length is None else length)
+            if with_stats:
+                line += '\t' + json.dumps(stats, sort_keys=True)
+            print(line, file=summary)
+            summary.flush()
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--inputfile",
         type=str,
-        required=True,
         help="The input file that contains the puzzles."
     )
     parser.add_argument(
         "--outputfile",
         type=str,
-        required=True,
         help="The output file that contains the solution."
     )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        default='boards',
+        choices=output_formats,
+        help="Write every board of the solution, or the first board and one line per move "
+             "(piece number, direction) which is much shorter for long solutions."
+    )
+    parser.add_argument(
+        "--stream-output",
+        action='store_true',
+        help="Write the boards one by one instead of joining the whole solution first."
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        help="A directory of puzzle files, or a manifest listing one puzzle file per line, "
+             "solved in parallel instead of --inputfile."
+    )
+    parser.add_argument(
+        "--outputdir",
+        type=str,
+        help="The directory the solutions of --batch are written to."
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default=None,
+        help="The file the --batch summary is written to, the standard output if not given."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="The number of --batch worker processes, or of hdastar processes, the number of CPUs by default."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="The maximum number of seconds spent on each puzzle, building a pattern database or state space table included."
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=None,
+        help="The maximum number of nodes expanded for each puzzle, including the boards expanded "
+             "to build a pattern database or state space table."
+    )
+    parser.add_argument(
+        "--verify",
+        action='store_true',
+        help="Check that the solution is a legal path from the start to the goal before writing it."
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        default=None,
+        choices=['json', 'text'],
+        help="Print the statistics of the search: nodes expanded and generated, duplicates, "
+             "peak frontier and time per phase. In batch mode they are added to the summary as json."
+    )
+    parser.add_argument(
+        "--progress",
+        type=int,
+        default=None,
+        help="Print the statistics to the standard error every this many expanded nodes."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="An SQLite file of solutions reused across runs."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=10000,
+        help="The number of solutions kept in --cache, the least recently used go first."
+    )
     parser.add_argument(
         "--algo",
         type=str,
         required=True,
-        choices=['astar', 'dfs'],
+        choices=['astar', 'wastar', 'arastar', 'hdastar', 'dfs', 'iddfs', 'idastar', 'bidirectional', 'table'],
         help="The searching algorithm."
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default='grid',
+        choices=['grid', 'bitboard'],
+        help="The board representation used during the search."
+    )
+    parser.add_argument(
+        "--move-metric",
+        type=str,
+        default='step',
+        choices=move_metrics,
+        help="How moves are counted: one cell steps, or slides through empty cells as one move."
+    )
+    parser.add_argument(
+        "--heuristic",
+        type=str,
+        default=None,
+        choices=list(heuristics),
+        help="The heuristic used by A*, manhattan by default and misplaced with --move-metric slide."
+    )
+    parser.add_argument(
+        "--pdb-pattern",
+        type=str,
+        default=None,
+        help="The pieces kept in the pattern database, as their characters (any of 1, 2, < and ^), "
+             "other shapes as comma separated WxH. Defaults to the 2x2 piece and as many blockers as fit."
+    )
+    parser.add_argument(
+        "--pdb-dir",
+        type=str,
+        default='pdb',
+        help="The directory where pattern databases are stored."
+    )
+    parser.add_argument(
+        "--table-dir",
+        type=str,
+        default='tables',
+        help="The directory of the state space tables used by --algo table."
+    )
+    parser.add_argument(
+        "--weight",
+        type=float,
+        default=2.0,
+        help="The weight of the heuristic for wastar, and of the first search of arastar."
+    )
+    parser.add_argument(
+        "--weight-step",
+        type=float,
+        default=0.5,
+        help="How much arastar lowers the weight after every solution."
+    )
+    parser.add_argument(
+        "--tie-break",
+        type=str,
+        default='g',
+        choices=['g', 'h'],
+        help="How A* breaks ties on f: prefer the higher g or the lower h."
+    )
+    parser.add_argument(
+        "--open-stats",
+        action='store_true',
+        help="Print the A* open list size and duplicate rate to the standard error."
+    )
+    parser.add_argument(
+        "--tt-size",
+        type=int,
+        default=1 << 16,
+        help="The number of entries of the IDA* transposition table, 0 to disable it."
+    )
+    parser.add_argument(
+        "--depth-limit",
+        type=int,
+        default=None,
+        help="The maximum depth of dfs, or the largest limit tried by iddfs."
+    )
     args = parser.parse_args()
 
-    # read the board from the file
-    board, goal_board = read_from_file(args.inputfile)
-
-    newState = State(board, None, 0, 0, None)
-    goalState = State(goal_board, None, 0, 0, None)
-
-    if args.algo == 'astar':
-        result_state = AStarsearch(newState, goalState)
-
-    elif args.algo == 'dfs':
-        result_state = DFSearch(newState, goalState)
-
-    generate_output(result_state, args.outputfile)
+    # A slide can move a piece several cells, so the distance heuristics overestimate slides.
+    if args.heuristic is None:
+        args.heuristic = 'misplaced' if args.move_metric == 'slide' else 'manhattan'
+    elif args.move_metric == 'slide' and args.heuristic in ['manhattan', 'nearest', 'assignment']:
+        parser.error('--heuristic {} is not admissible with --move-metric slide, use misplaced or pdb'.format(
+            args.heuristic))
+
+    if args.batch:
+        if not args.outputdir:
+            parser.error('--batch requires --outputdir')
+
+        tasks = batch_tasks(args.batch, args.outputdir, args)
+        if args.summary:
+            with open(args.summary, 'w') as summary:
+                solve_batch(tasks, args.workers, summary)
+        else:
+            solve_batch(tasks, args.workers, sys.stdout)
+
+    else:
+        if not args.inputfile or not args.outputfile:
+            parser.error('--inputfile and --outputfile are required without --batch')
+
+        budget = make_budget(args)
+
+        # read the board from the file
+        with search_phase(budget, 'read'):
+            board, goal_board = read_from_file(args.inputfile)
+
+        # The shapes of --pdb-pattern are only known once the puzzle is read.
+        if args.heuristic == 'pdb' and args.pdb_pattern:
+            try:
+                parse_pdb_pattern(args.pdb_pattern)
+            except ValueError as e:
+                parser.error(str(e))
+
+        try:
+            result_state, stats, cached = solve(board, goal_board, args, budget, args.outputfile)
+        except SearchBudgetExceeded as e:
+            if args.stats:
+                print(e.budget.report(), file=sys.stderr)
+            sys.exit('search stopped: {}'.format(e))
+
+        if result_state is None:
+            if args.stats:
+                print(stats.report(), file=sys.stderr)
+            sys.exit('no solution')
+
+        if args.verify and not is_valid_path(path_boards(result_state), board, goal_board):
+            sys.exit('the solution found is not a legal path')
+
+        with search_phase(budget, 'output'):
+            generate_output(result_state, args.outputfile, args.output_format, args.stream_output)
+
+        if args.stats == 'json':
+            print(json.dumps(stats.to_dict(), sort_keys=True))
+        elif args.stats == 'text':
+            print(stats.report())
 
 
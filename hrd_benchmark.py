@@ -0,0 +1,123 @@
+"""
+Micro-benchmark of the Hua Rong Dao successor generators.
+
+It samples boards reachable from a start board and reports how many
+successors per second each generator produces on them.
+"""
+import argparse
+import time
+
+from hrd import Board, Piece, read_from_file, grid_successors, pack_board, packed_successors
+
+#====================================================================================
+
+def classic_board():
+    """
+    Returns the classic starting layout:
+
+    ^11^
+    v11v
+    ^<>^
+    v22v
+    2..2
+    """
+    pieces = [Piece(False, False, 0, 0, 'v'), Piece(True, False, 1, 0, None),
+              Piece(False, False, 3, 0, 'v'), Piece(False, False, 0, 2, 'v'),
+              Piece(False, False, 1, 2, 'h'), Piece(False, False, 3, 2, 'v'),
+              Piece(False, True, 1, 3, None), Piece(False, True, 2, 3, None),
+              Piece(False, True, 0, 4, None), Piece(False, True, 3, 4, None)]
+    return Board(5, pieces)
+
+
+def legacy_successors(board:Board):
+    """
+    The successor generator used before the occupancy grid: every candidate move
+    builds coordinate sets of all the other pieces and every child rebuilds its grid.
+    """
+    successors = []
+    width, height = board.width, board.height
+
+    for piece in board.pieces:
+        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+            new_x = piece.coord_x + dx
+            new_y = piece.coord_y + dy
+
+            if piece.is_within_board(new_x, new_y, width, height):
+                if not board.is_occupied(new_x, new_y, piece):
+                    new_pieces = [p for p in board.pieces]
+                    new_piece = Piece(piece.is_2_by_2, piece.is_single, new_x, new_y, piece.orientation, piece.shape)
+                    new_pieces[board.pieces.index(piece)] = new_piece
+                    successors.append(Board(board.height, new_pieces, board.width))
+
+    return successors
+
+
+def sample_boards(board:Board, count):
+    """
+    Returns up to count boards reachable from the given board, in breadth first order.
+    """
+    boards = [board]
+    seen = set([board.key()])
+
+    for current in boards:
+        if len(boards) >= count:
+            break
+        for child in grid_successors(current):
+            if child.key() not in seen:
+                seen.add(child.key())
+                boards.append(child)
+
+    return boards[:count]
+
+
+def run(name, generator, boards, repeat):
+    """
+    Times the generator over the boards and prints the successors per second.
+    """
+    total = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board in boards:
+            total += len(generator(board))
+    elapsed = time.perf_counter() - start
+
+    print('{:<8} {:>10} successors {:>8.3f}s {:>12.0f} successors/s'.format(name, total, elapsed, total / elapsed))
+    return total / elapsed
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--inputfile",
+        type=str,
+        default=None,
+        help="The puzzle whose start board is sampled. Defaults to the classic layout."
+    )
+    parser.add_argument(
+        "--boards",
+        type=int,
+        default=2000,
+        help="The number of boards sampled."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="The number of passes over the sampled boards."
+    )
+    args = parser.parse_args()
+
+    if args.inputfile:
+        board, goal_board = read_from_file(args.inputfile)
+    else:
+        board = classic_board()
+
+    boards = sample_boards(board, args.boards)
+    packed = [pack_board(b) for b in boards]
+
+    before = run('legacy', legacy_successors, boards, args.repeat)
+    grid = run('grid', grid_successors, boards, args.repeat)
+    bitboard = run('bitboard', packed_successors, packed, args.repeat)
+
+    print('grid speedup {:.1f}x, bitboard speedup {:.1f}x'.format(grid / before, bitboard / before))
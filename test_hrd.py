@@ -0,0 +1,79 @@
+"""
+Regression tests of the Hua Rong Dao searches.
+
+Run with: python -m unittest test_hrd
+"""
+import unittest
+
+from hrd import (Board, State, ManhattanHeuristic, ARAStarsearch, HDAStarsearch,
+                 goal_allows_mirror, grid_pieces, is_valid_path, pack_board, path_boards)
+
+#====================================================================================
+
+# The classic layout, and a goal 72 moves away that is its own mirror image.
+# With the goal symmetric the searches fold a board and its mirror into one
+# state, which once rebuilt paths through the parent of the mirror image and
+# gave illegal moves on this puzzle.
+start_rows = ['^11^',
+              'v11v',
+              '^<>^',
+              'v22v',
+              '2..2']
+symmetric_goal_rows = ['2112',
+                       '2112',
+                       '.^^.',
+                       '^vv^',
+                       'v<>v']
+
+
+def symmetric_puzzle():
+    """
+    Returns the start and goal boards of the symmetric goal puzzle.
+    """
+    board = Board(len(start_rows), grid_pieces(start_rows), 4)
+    goal_board = Board(len(symmetric_goal_rows), grid_pieces(symmetric_goal_rows), 4)
+    return board, goal_board
+
+
+def search_states(board, goal_board):
+    """
+    Returns the initial and goal states of a search with the manhattan heuristic.
+    """
+    initial_state = State(board, ManhattanHeuristic(goal_board), 0, 0, None)
+    return initial_state, State(goal_board, None, 0, 0, None)
+
+
+class SymmetricGoalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board, self.goal_board = symmetric_puzzle()
+        self.assertTrue(goal_allows_mirror(self.goal_board))
+
+    def assertValidPath(self, result_state, board, goal_board):
+        # The path of a search on packed boards is checked against the grid boards.
+        self.assertIsNotNone(result_state)
+        self.assertTrue(is_valid_path(path_boards(result_state), board, goal_board))
+
+    def test_arastar_grid(self):
+        result_state = ARAStarsearch(*search_states(self.board, self.goal_board))
+        self.assertValidPath(result_state, self.board, self.goal_board)
+
+    def test_arastar_bitboard(self):
+        board, goal_board = pack_board(self.board), pack_board(self.goal_board)
+        result_state = ARAStarsearch(*search_states(board, goal_board))
+        self.assertValidPath(result_state, self.board, self.goal_board)
+
+    def test_hdastar_grid(self):
+        for workers in [1, 2, 3]:
+            result_state = HDAStarsearch(*search_states(self.board, self.goal_board), workers=workers)
+            self.assertValidPath(result_state, self.board, self.goal_board)
+
+    def test_hdastar_bitboard(self):
+        board, goal_board = pack_board(self.board), pack_board(self.goal_board)
+        for workers in [1, 2, 3]:
+            result_state = HDAStarsearch(*search_states(board, goal_board), workers=workers)
+            self.assertValidPath(result_state, self.board, self.goal_board)
+
+
+if __name__ == '__main__':
+    unittest.main()